@@ -20,7 +20,17 @@ import os
 import json
 import sfmApp # built-in, ignore warnings
 import time
+import select
+import struct
+import array
+import base64
+import operator
+import sys
+import collections
+import threading
+import zlib
 from PySide import QtGui
+from PySide import QtCore
 from PySide import shiboken
 from atexit import register
 
@@ -58,114 +68,1356 @@ recursive_elements = [
     "overrideParent", # Parents cause recursion errors.
 ]
 
-# We're good to go.
-# Parse an attribute, used for JSON parsing.
-def ParseAttribute(attribute, parsed, parent, lastparent):
-    # Prevent recursion.
+# Python 2 (SFM) and Python 3 have different names for these.
+try:
+    integer_types = (int, long)
+    text_type = unicode
+except NameError:
+    integer_types = (int,)
+    text_type = str
+
+# A parsed value that remembers which datamodel type it came from.
+# It is sent as a regular object in JSON, the binary encoding uses the type to pack it.
+class TypedValue(dict):
+    __slots__ = ("kind",)
+    def __init__(self, kind, fields):
+        dict.__init__(self, fields)
+        self.kind = kind
+
+# A numeric or vector array packed into one contiguous little-endian buffer.
+# Vectors are flattened, so there are stride numbers for every item.
+class PackedArray(object):
+    __slots__ = ("kind", "stride", "data")
+    def __init__(self, kind, stride, data):
+        self.kind = kind
+        self.stride = stride
+        self.data = data
+    def __len__(self):
+        return len(self.data) // self.stride
+    def __eq__(self, other):
+        return isinstance(other, PackedArray) and self.kind == other.kind and self.data == other.data
+    def __ne__(self, other):
+        return not self == other
+    def tobytes(self):
+        if hasattr(self.data, "tobytes"):
+            return self.data.tobytes()
+        return self.data.tostring()
+
+# Array types that are packed: item kind, array typecode, stride and how to get the
+# numbers out of each item. Kinds are numbered in this order in binary frames.
+packed_types = {
+    "float_array": ("float", "f", 1, None),
+    "int_array": ("int", "i", 1, None),
+    "bool_array": ("bool", "B", 1, None),
+    "color_array": ("color", "B", 4, lambda color: (color.r(), color.g(), color.b(), color.a())),
+    "vector2_array": ("vector2", "f", 2, operator.attrgetter("x", "y")),
+    "vector3_array": ("vector3", "f", 3, operator.attrgetter("x", "y", "z")),
+    "vector4_array": ("vector4", "f", 4, operator.attrgetter("x", "y", "z", "w")),
+    "qangle_array": ("qangle", "f", 3, operator.attrgetter("x", "y", "z")),
+    "quaternion_array": ("quaternion", "f", 4, operator.attrgetter("x", "y", "z", "w")),
+}
+packed_kinds = ["float", "int", "bool", "color", "vector2", "vector3", "vector4", "qangle", "quaternion"]
+packed_formats = {"f": "float32", "i": "int32", "B": "uint8"}
+
+# Copy an array attribute's values into a PackedArray in a single pass.
+def PackArray(typestring, values, count):
+    kind, typecode, stride, components = packed_types[typestring]
+    if components is None:
+        data = array.array(typecode, [values[i] for i in range(count)])
+    else:
+        data = array.array(typecode, [number for i in range(count) for number in components(values[i])])
+    if sys.byteorder == "big":
+        data.byteswap()
+    return PackedArray(kind, stride, data)
+
+# Encodings we can send, the server picks one by replying with an "encoding" message.
+supported_encodings = ["json", "binary"]
+
+# Binary frames: magic, format version, flags, payload length, then one tagged value.
+# Streamed frames are split into chunks, each with its own header, and their
+# dicts and lists are written without a count and closed by an end marker.
+# Keep these in sync with tools/sfm_bridge_binary.py.
+BINARY_MAGIC = b"SFMB"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sBBI")
+# Set on every chunk of a streamed frame except the last.
+FLAG_MORE = 1
+# Compressed packets have the same header with their own magic, see FrameCompressor.
+COMPRESSED_MAGIC = b"SFMZ"
+# Set on the first packet of a compressed stream, the receiver starts a new decompressor.
+FLAG_RESET = 2
+# Set with FLAG_RESET when the stream is primed with a dictionary.
+FLAG_DICTIONARY = 4
+TAG_NONE = 0
+TAG_FALSE = 1
+TAG_TRUE = 2
+TAG_INT = 3
+TAG_FLOAT = 4
+TAG_STRING = 5
+TAG_LIST = 6
+TAG_DICT = 7
+TAG_ARRAY = 8
+TAG_DICT_STREAM = 9
+TAG_LIST_STREAM = 10
+TAG_END = 11
+TAG_COLOR = 16
+TAG_VECTOR2 = 17
+TAG_VECTOR3 = 18
+TAG_VECTOR4 = 19
+TAG_QANGLE = 20
+TAG_QUATERNION = 21
+# Tag, struct and field names for each TypedValue kind.
+binary_types = {
+    "color": (TAG_COLOR, struct.Struct("<4B"), ("r", "g", "b", "a")),
+    "vector2": (TAG_VECTOR2, struct.Struct("<2f"), ("x", "y")),
+    "vector3": (TAG_VECTOR3, struct.Struct("<3f"), ("x", "y", "z")),
+    "vector4": (TAG_VECTOR4, struct.Struct("<4f"), ("x", "y", "z", "w")),
+    "qangle": (TAG_QANGLE, struct.Struct("<3f"), ("x", "y", "z")),
+    "quaternion": (TAG_QUATERNION, struct.Struct("<4f"), ("x", "y", "z", "w")),
+}
+
+# Attribute parsers take the attribute and its value (fetched once) and return
+# what should be sent, or None if there is nothing to send.
+def ParseElementAttribute(attribute, value):
+    if value != None:
+        return ParseElement(value, attribute)
+    return None
+
+def ParseElementArrayAttribute(attribute, value):
+    if attribute.count() > 0:
+        parsed = []
+        if value != None:
+            for i in range(attribute.count()):
+                # Recursively parse the element array.
+                if value[i] != None:
+                    parsed.append(ParseElement(value[i], attribute))
+        return parsed
+    return None
+
+def ParseStringArrayAttribute(attribute, value):
+    if attribute.count() > 0 and value != None:
+        return [value[i] for i in range(attribute.count()) if value[i] != None]
+    return None
+
+def ParseScalarAttribute(attribute, value):
+    # should pass through as is
+    return value
+
+def TypedValueParser(kind, components):
+    fields = binary_types[kind][2]
+    def ParseTypedValueAttribute(attribute, value):
+        return TypedValue(kind, zip(fields, components(value)))
+    return ParseTypedValueAttribute
+
+def PackedArrayParser(typestring):
+    def ParsePackedArrayAttribute(attribute, value):
+        if attribute.count() > 0 and value != None:
+            return PackArray(typestring, value, attribute.count())
+        return None
+    return ParsePackedArrayAttribute
+
+# Attribute type string to parser.
+# Unsupported types (binary, time and matrix, plus their arrays) are left out and skipped.
+# TODO: Implement these types.
+attribute_parsers = {
+    "element": ParseElementAttribute,
+    "element_array": ParseElementArrayAttribute,
+    "string_array": ParseStringArrayAttribute,
+    "string": ParseScalarAttribute,
+    "bool": ParseScalarAttribute,
+    "int": ParseScalarAttribute,
+    "float": ParseScalarAttribute,
+    "color": TypedValueParser("color", lambda color: (color.r(), color.g(), color.b(), color.a())),
+}
+for kind in ["vector2", "vector3", "vector4", "qangle", "quaternion"]:
+    attribute_parsers[kind] = TypedValueParser(kind, operator.attrgetter(*binary_types[kind][2]))
+for typestring in packed_types:
+    attribute_parsers[typestring] = PackedArrayParser(typestring)
+
+# Element type string to a plan of its attributes: attribute name to (type string, parser).
+# Elements of the same type share their attributes, so after the first one has been
+# parsed the rest skip the type lookups. Skipped attributes have no parser.
+element_plans = {}
+# Element types without a fixed set of attributes, the same name can have a different
+# type on every element, so each element gets its own plan.
+dynamic_element_types = ["DmElement"]
+
+def PlanAttribute(attribute):
     if attribute.GetName() in recursive_elements:
+        return (None, None)
+    typestring = attribute.GetTypeString()
+    return (typestring, attribute_parsers.get(typestring))
+
+# Python 2 on Windows (SFM) only has a precise clock in time.clock.
+if hasattr(time, "perf_counter"):
+    stats_clock = time.perf_counter
+elif sys.platform == "win32":
+    stats_clock = time.clock
+else:
+    stats_clock = time.time
+
+# How many of the latest samples each span keeps, and how often "stats" messages are sent (seconds).
+stats_window = 300
+stats_interval = 1.0
+
+# Hot path instrumentation: timing spans for each stage of a frame and counters
+# for elements visited, attributes read per type string and bytes queued.
+# Everything checks enabled first, so it costs next to nothing when disabled.
+# Spans: scrub (moving the playhead), walk, diff, encode (includes waiting for the send
+# queue), socket (sender thread), frame (all of it), exportScrub and ackWait (exports).
+class FrameStats(object):
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+    def reset(self):
+        # Span name to its latest durations in seconds.
+        self.spans = {}
+        self.frames = 0
+        self.elements = 0
+        self.attributes = {}
+        self.bytes = 0
+    def span(self, name, started):
+        samples = self.spans.get(name)
+        if samples is None:
+            samples = self.spans[name] = collections.deque(maxlen=stats_window)
+        samples.append(stats_clock() - started)
+    # Percentiles of each span in milliseconds, and the counters.
+    def summary(self):
+        spans = {}
+        for name, samples in list(self.spans.items()):
+            samples = sorted(samples)
+            if samples:
+                spans[name] = {
+                    "count": len(samples),
+                    "p50": round(samples[len(samples) // 2] * 1000, 3),
+                    "p95": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+                    "max": round(samples[-1] * 1000, 3),
+                }
+        return {"frames": self.frames, "elements": self.elements, "attributes": dict(self.attributes), "bytes": self.bytes, "spans": spans}
+    def text(self):
+        summary = self.summary()
+        lines = [str(summary["frames"]) + " frames, " + str(summary["elements"]) + " elements, " + str(sum(summary["attributes"].values())) + " attributes, " + str(summary["bytes"] // 1024) + " KB"]
+        for name in sorted(summary["spans"]):
+            span = summary["spans"][name]
+            lines.append(name + ": p50 " + str(span["p50"]) + " ms, p95 " + str(span["p95"]) + " ms, max " + str(span["max"]) + " ms")
+        return "\n".join(lines)
+    def dump(self, path):
+        with open(path, "w") as file:
+            json.dump(self.summary(), file, indent=2, sort_keys=True)
+
+frame_stats = FrameStats()
+
+# Serialized subtrees from previous frames, keyed by element id.
+# An element whose parsed values all match its cached entry returns the cached object,
+# so unchanged subtrees keep their identity and their binary encoding is reused.
+# Least recently used entries are evicted once the (approximate) size goes over budget.
+class SubtreeCacheEntry(object):
+    __slots__ = ("key", "parsed", "binary", "size")
+    def __init__(self, key, parsed):
+        self.key = key
+        self.parsed = parsed
+        self.binary = None
+        self.size = 64 * len(parsed) + 256
+
+class SubtreeCache(object):
+    def __init__(self, budget):
+        self.budget = budget
+        self.size = 0
+        self.entries = collections.OrderedDict()
+        self.parsed = {}
+    def get(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.entries[key] = entry
+        return entry
+    # The entry a parsed dict belongs to, if it is still cached.
+    def lookup(self, parsed):
+        return self.parsed.get(id(parsed))
+    def put(self, key, parsed):
+        self.remove(key)
+        entry = SubtreeCacheEntry(key, parsed)
+        self.entries[key] = entry
+        self.parsed[id(parsed)] = entry
+        self.size += entry.size
+        self.evict()
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            del self.parsed[id(entry.parsed)]
+            self.size -= entry.size
+    # Account for an entry growing, e.g. when its binary encoding is stored.
+    def grow(self, entry, size):
+        entry.size += size
+        if self.entries.get(entry.key) is entry:
+            self.size += size
+            self.evict()
+    def evict(self):
+        while self.size > self.budget and self.entries:
+            self.remove(next(iter(self.entries)))
+    def clear(self):
+        self.entries.clear()
+        self.parsed.clear()
+        self.size = 0
+
+subtree_cache = SubtreeCache(0)
+
+# Elements are identified by their datamodel id, Python wrappers are recreated on every access.
+def ElementKey(dag):
+    return str(dag.GetId())
+
+# Check if a freshly parsed element is the same as its cached one.
+# Child elements are compared by identity since unchanged children come from the cache too.
+def SameParsed(previous, current):
+    if len(previous) != len(current):
         return False
-    elif attribute.GetTypeString() == "element":
-        # globalFlexControllers has attributes with recursive "gameModel" attributes.
-        # We need to avoid that.
-        if lastparent is not None and lastparent.GetName() == "globalFlexControllers":
+    for key in current:
+        if key not in previous:
             return False
-        # Recursively parse the element.
-        if attribute.GetValue() != None:
-            parsed[attribute.GetName()] = ParseElement(attribute.GetValue(), attribute)
-        return True
-    elif attribute.GetTypeString() == "color":
-        parsed[attribute.GetName()] = {
-            "r": attribute.GetValue().r(),
-            "g": attribute.GetValue().g(),
-            "b": attribute.GetValue().b(),
-            "a": attribute.GetValue().a()
-        }
-        return True
-    elif attribute.GetTypeString() == "vector2":
-        parsed[attribute.GetName()] = {
-            "x": attribute.GetValue().x,
-            "y": attribute.GetValue().y
-        }
-        return True
-    elif attribute.GetTypeString() == "vector3":
-        parsed[attribute.GetName()] = {
-            "x": attribute.GetValue().x,
-            "y": attribute.GetValue().y,
-            "z": attribute.GetValue().z
-        }
-        return True
-    elif attribute.GetTypeString() == "vector4":
-        parsed[attribute.GetName()] = {
-            "x": attribute.GetValue().x,
-            "y": attribute.GetValue().y,
-            "z": attribute.GetValue().z,
-            "w": attribute.GetValue().w
-        }
-        return True
-    elif attribute.GetTypeString() == "qangle":
-        parsed[attribute.GetName()] = {
-            "x": attribute.GetValue().x,
-            "y": attribute.GetValue().y,
-            "z": attribute.GetValue().z
-        }
-        return True
-    elif attribute.GetTypeString() == "quaternion":
-        parsed[attribute.GetName()] = {
-            "x": attribute.GetValue().x,
-            "y": attribute.GetValue().y,
-            "z": attribute.GetValue().z,
-            "w": attribute.GetValue().w
+        old = previous[key]
+        new = current[key]
+        if old is new:
+            continue
+        if type(new) is dict:
+            return False
+        if type(new) is list:
+            if type(old) is not list or len(old) != len(new):
+                return False
+            for i in range(len(new)):
+                if old[i] is not new[i] and (type(new[i]) is dict or old[i] != new[i]):
+                    return False
+        elif old != new:
+            return False
+    return True
+
+# Elements are walked as a stream of events instead of recursively, so deep
+# hierarchies can't hit the recursion limit and nothing has to be built up front.
+# (EVENT_ELEMENT, name, source, variant) opens an object, source is the element
+# (or the subtree cache entry when walking a parsed tree), (EVENT_ARRAY, name, None, None)
+# opens a list, (EVENT_VALUE, name, value) adds a value, (EVENT_END,) closes the last
+# object or list and (EVENT_RAW, name, data) adds an already encoded binary value.
+# Names are None for list items.
+EVENT_VALUE = 0
+EVENT_ELEMENT = 1
+EVENT_ARRAY = 2
+EVENT_END = 3
+EVENT_RAW = 4
+END_EVENT = (EVENT_END,)
+
+def ElementPlan(dag):
+    typestring = dag.GetTypeString()
+    plan = element_plans.get(typestring)
+    if plan is None:
+        plan = {}
+        if typestring not in dynamic_element_types:
+            element_plans[typestring] = plan
+    return plan
+
+# Subscriptions limit the walk to the parts of the film clip the server asked for.
+# Paths are attribute names separated by "/" starting below the film clip, "*" matches
+# any attribute or array item and array items can also be picked by index,
+# e.g. ["camera", "animationSets/*/gameModel/children/*/transform"].
+# They compile into nested dicts of names, None marks a subtree that is sent whole.
+# No paths (None or empty) subscribes to everything and compiles to None.
+def CompileSubscription(paths):
+    if not paths:
+        return None
+    compiled = {}
+    for path in paths:
+        node = None
+        for name in reversed([name for name in path.split("/") if name]):
+            node = {name: node}
+        compiled = MergeSubscription(compiled, node)
+    return SpreadWildcards(compiled)
+
+def MergeSubscription(first, second):
+    if first is None or second is None:
+        return None
+    merged = dict(first)
+    for name in second:
+        merged[name] = MergeSubscription(merged[name], second[name]) if name in merged else second[name]
+    return merged
+
+# Names next to a "*" also get everything the "*" asks for, so the walk only has to look one up.
+def SpreadWildcards(node):
+    if node is None:
+        return None
+    spread = {}
+    for name in node:
+        child = node[name]
+        if name != "*" and "*" in node:
+            child = MergeSubscription(child, node["*"])
+        spread[name] = SpreadWildcards(child)
+    return spread
+
+# Cached subtrees depend on how they were walked, see ParseElement.
+def WalkVariant(skip_elements, subscription):
+    if subscription is None:
+        return skip_elements
+    return (skip_elements, id(subscription))
+
+def WalkElement(dag, parent, name, subscription=None):
+    # globalFlexControllers has attributes with recursive "gameModel" attributes.
+    skip_elements = parent is not None and parent.GetName() == "globalFlexControllers"
+    yield (EVENT_ELEMENT, name, dag, WalkVariant(skip_elements, subscription))
+    # Elements being walked, an element that contains itself is only walked once.
+    ancestors = set()
+    # Attributes read per type string, only counted when instrumentation is enabled.
+    counts = frame_stats.attributes if frame_stats.enabled else None
+    # Element cursors: [True, next attribute, plan, skip_elements, subscription, named attributes, key]
+    # Element array cursors: [False, values, next index, count, skip_elements, subscription, padded]
+    stack = [ElementCursor(dag, ElementKey(dag), skip_elements, subscription, ancestors)]
+    while stack:
+        cursor = stack[-1]
+        if cursor[0]:
+            attribute = cursor[1]
+            if attribute is None:
+                stack.pop()
+                ancestors.discard(cursor[6])
+                yield END_EVENT
+                continue
+            cursor[1] = attribute.NextAttribute() if cursor[5] is None else next(cursor[5], None)
+            name = attribute.GetName()
+            subscription = cursor[4]
+            if subscription is not None:
+                subscription = subscription.get(name, subscription.get("*", False))
+                if subscription is False:
+                    continue
+            plan = cursor[2]
+            typestring, parser = plan.get(name) or plan.setdefault(name, PlanAttribute(attribute))
+            # Subscribing to an attribute by name overrides recursive_elements.
+            if parser is None and cursor[4] is not None and name in cursor[4]:
+                typestring = attribute.GetTypeString()
+                parser = attribute_parsers.get(typestring)
+            if parser is None or (cursor[3] and typestring == "element"):
+                continue
+            if counts is not None:
+                counts[typestring] = counts.get(typestring, 0) + 1
+            value = attribute.GetValue()
+            if typestring == "element":
+                key = ElementKey(value) if value != None else None
+                if key is not None and key not in ancestors:
+                    skip_elements = name == "globalFlexControllers"
+                    yield (EVENT_ELEMENT, name, value, WalkVariant(skip_elements, subscription))
+                    stack.append(ElementCursor(value, key, skip_elements, subscription, ancestors))
+            elif typestring == "element_array":
+                count = attribute.count()
+                if count > 0:
+                    yield (EVENT_ARRAY, name, None, None)
+                    count, padded = SubscribedItems(subscription, count if value != None else 0)
+                    stack.append([False, value, 0, count, name == "globalFlexControllers", subscription, padded])
+            else:
+                value = parser(attribute, value)
+                if value is not None:
+                    yield (EVENT_VALUE, name, value)
+        else:
+            if cursor[2] >= cursor[3]:
+                stack.pop()
+                yield END_EVENT
+                continue
+            item = cursor[1][cursor[2]]
+            subscription = cursor[5]
+            if subscription is not None:
+                subscription = subscription.get(str(cursor[2]), subscription.get("*", False))
+            cursor[2] += 1
+            key = ElementKey(item) if subscription is not False and item != None else None
+            if key is not None and key not in ancestors:
+                yield (EVENT_ELEMENT, None, item, WalkVariant(cursor[4], subscription))
+                stack.append(ElementCursor(item, key, cursor[4], subscription, ancestors))
+            elif cursor[6]:
+                yield (EVENT_VALUE, None, None)
+
+# How many items of an element array to walk, and whether items that are left out are
+# sent as null. Items picked by index keep their position that way, and nothing after
+# the last picked item is walked.
+def SubscribedItems(subscription, count):
+    if subscription is None or "*" in subscription:
+        return count, False
+    indices = [int(name) for name in subscription if name.isdigit()]
+    if not indices:
+        return 0, False
+    return min(count, max(indices) + 1), True
+
+def ElementCursor(dag, key, skip_elements, subscription, ancestors):
+    ancestors.add(key)
+    if frame_stats.enabled:
+        frame_stats.elements += 1
+    # Without a "*" only the subscribed attributes are looked up, the others are never visited.
+    if subscription is None or "*" in subscription:
+        return [True, dag.FirstAttribute(), ElementPlan(dag), skip_elements, subscription, None, key]
+    named = iter([attribute for attribute in (dag.GetAttribute(name) for name in subscription) if attribute is not None])
+    return [True, next(named, None), ElementPlan(dag), skip_elements, subscription, named, key]
+
+# Walk an already parsed value, when binary is set unchanged cached subtrees
+# are passed along with their stored encoding.
+def WalkParsed(value, name, binary):
+    stack = [iter([(name, value)])]
+    while stack:
+        try:
+            name, value = next(stack[-1])
+        except StopIteration:
+            stack.pop()
+            if stack:
+                yield END_EVENT
+            continue
+        if type(value) is dict:
+            entry = subtree_cache.lookup(value) if binary else None
+            if entry is not None and entry.binary is not None:
+                yield (EVENT_RAW, name, entry.binary)
+            else:
+                yield (EVENT_ELEMENT, name, entry, None)
+                stack.append(iter(value.items()))
+        elif type(value) is list:
+            yield (EVENT_ARRAY, name, None, None)
+            stack.append(iter([(None, item) for item in value]))
+        else:
+            yield (EVENT_VALUE, name, value)
+
+# Walk a frame message, events for an extra attribute streamed straight from
+# the scene (the film clip) can be appended to it.
+def WalkFrame(framedata, events, binary):
+    yield (EVENT_ELEMENT, None, None, None)
+    for key in framedata:
+        for event in WalkParsed(framedata[key], key, binary):
+            yield event
+    if events is not None:
+        for event in events:
+            yield event
+    yield END_EVENT
+
+def ParseElement(dag, parent, subscription=None, cached=True):
+    stack = []
+    for event in WalkElement(dag, parent, None, subscription):
+        if event[0] == EVENT_ELEMENT:
+            stack.append(({}, event[1], event[2], event[3]))
+            continue
+        elif event[0] == EVENT_ARRAY:
+            stack.append(([], event[1], None, None))
+            continue
+        elif event[0] == EVENT_VALUE:
+            name = event[1]
+            parsed = event[2]
+        else:
+            parsed, name, element, variant = stack.pop()
+            if element is not None and cached and subtree_cache.budget > 0:
+                key = (ElementKey(element), variant)
+                entry = subtree_cache.get(key)
+                if entry is not None and SameParsed(entry.parsed, parsed):
+                    parsed = entry.parsed
+                else:
+                    subtree_cache.put(key, parsed)
+            if not stack:
+                return parsed
+        if name is None:
+            stack[-1][0].append(parsed)
+        else:
+            stack[-1][0][name] = parsed
+
+# Compare a parsed value against the one sent in the previous frame.
+# Anything that differs is recorded in changes as a path (a list of
+# attribute names and array indices) starting from the film clip.
+def DiffParsed(previous, current, path, changes):
+    # Unchanged subtrees come from the subtree cache as the same object.
+    if previous is current:
+        return changes
+    if type(previous) is dict and type(current) is dict:
+        for key in current:
+            if key not in previous:
+                changes["added"].append([path + [key], current[key]])
+            else:
+                DiffParsed(previous[key], current[key], path + [key], changes)
+        for key in previous:
+            if key not in current:
+                changes["removed"].append(path + [key])
+    elif type(previous) is list and type(current) is list and len(previous) == len(current):
+        for i in range(len(current)):
+            DiffParsed(previous[i], current[i], path + [i], changes)
+    elif previous != current:
+        changes["changed"].append([path, current])
+    return changes
+
+# Append the binary encoding of a parsed value to out, a list of byte strings.
+def EncodeBinary(value, out):
+    if value is None:
+        out.append(struct.pack("<B", TAG_NONE))
+    elif value is True:
+        out.append(struct.pack("<B", TAG_TRUE))
+    elif value is False:
+        out.append(struct.pack("<B", TAG_FALSE))
+    elif isinstance(value, TypedValue):
+        tag, packer, fields = binary_types[value.kind]
+        out.append(struct.pack("<B", tag))
+        out.append(packer.pack(*[value[field] for field in fields]))
+    elif isinstance(value, PackedArray):
+        out.append(struct.pack("<BBI", TAG_ARRAY, packed_kinds.index(value.kind), len(value)))
+        out.append(value.tobytes())
+    elif isinstance(value, dict):
+        # Reuse the encoding of subtrees that haven't changed since they were last sent.
+        entry = subtree_cache.lookup(value)
+        if entry is not None and entry.binary is not None:
+            out.append(entry.binary)
+            return out
+        start = len(out)
+        out.append(struct.pack("<BI", TAG_DICT, len(value)))
+        for key in value:
+            name = key.encode("utf-8") if isinstance(key, text_type) else key
+            out.append(struct.pack("<H", len(name)))
+            out.append(name)
+            EncodeBinary(value[key], out)
+        if entry is not None:
+            entry.binary = b"".join(out[start:])
+            del out[start:]
+            out.append(entry.binary)
+            subtree_cache.grow(entry, len(entry.binary))
+    elif isinstance(value, (list, tuple)):
+        out.append(struct.pack("<BI", TAG_LIST, len(value)))
+        for item in value:
+            EncodeBinary(item, out)
+    elif isinstance(value, integer_types):
+        out.append(struct.pack("<Bq", TAG_INT, value))
+    elif isinstance(value, float):
+        out.append(struct.pack("<Bd", TAG_FLOAT, value))
+    else:
+        if isinstance(value, text_type):
+            value = value.encode("utf-8")
+        elif not isinstance(value, bytes):
+            value = str(value).encode("utf-8")
+        out.append(struct.pack("<BI", TAG_STRING, len(value)))
+        out.append(value)
+    return out
+
+# Used by json.dumps for values it can't encode by itself.
+def EncodeJSONDefault(value):
+    if isinstance(value, PackedArray):
+        return {
+            "packed": value.kind,
+            "format": packed_formats[value.data.typecode],
+            "stride": value.stride,
+            "count": len(value),
+            "data": base64.b64encode(value.tobytes()).decode("ascii")
         }
-        return True
-    # Arrays
-    elif attribute.GetTypeString() == "element_array":
-        if attribute.count() > 0:
-            parsed[attribute.GetName()] = []
-            if attribute.GetValue() != None:
-                for i in range(attribute.count()):
-                    # Recursively parse the element array.
-                    if attribute.GetValue()[i-1] != None:
-                        parsed[attribute.GetName()].append(ParseElement(attribute.GetValue()[i-1], attribute))
-        return True
-    elif attribute.GetTypeString() == "color_array" or attribute.GetTypeString() == "vector2_array" or attribute.GetTypeString() == "vector3_array" or attribute.GetTypeString() == "vector4_array" or attribute.GetTypeString() == "qangle_array" or attribute.GetTypeString() == "quaternion_array":
-        if attribute.count() > 0:
-            if attribute.GetValue() != None:
-                parsed[attribute.GetName()] = []
-                print(attribute.GetName(), parent.GetName(), lastparent.GetName())
-                for i in range(attribute.count()):
-                    if attribute.GetValue()[i-1] != None:
-                        parsed[attribute.GetName()].append(ParseAttribute(attribute.GetValue()[i-1], parsed[attribute.GetName()], attribute, parent))
-        return True
-    elif attribute.GetTypeString() == "string_array" or attribute.GetTypeString() == "bool_array" or attribute.GetTypeString() == "int_array" or attribute.GetTypeString() == "float_array": 
-        if attribute.count() > 0:
-            if attribute.GetValue() != None:
-                parsed[attribute.GetName()] = []
-                for i in range(attribute.count()):
-                    if attribute.GetValue()[i-1] != None:
-                        parsed[attribute.GetName()].append(attribute.GetValue()[i-1])
-        return True
-    elif attribute.GetTypeString() == "string" or attribute.GetTypeString() == "bool" or attribute.GetTypeString() == "int" or attribute.GetTypeString() == "float":
-        # should pass through as is
-        parsed[attribute.GetName()] = attribute.GetValue()
-        return True
+    raise TypeError(repr(value) + " is not JSON serializable")
+
+# Collects the encoded bytes of a frame in a reusable buffer and hands them to sink
+# every chunksize bytes, so a frame is never held in memory all at once.
+# sink(data, final) must be done with the buffer when it returns, final is set on
+# the last chunk of the frame.
+class FrameWriter(object):
+    def __init__(self, sink, encoding, chunksize=65536):
+        self.sink = sink
+        self.encoding = encoding
+        self.chunksize = chunksize
+        self.buffer = bytearray()
+        # Lists collecting everything written while a cached subtree is encoded.
+        self.captures = []
+    def begin(self):
+        del self.buffer[:]
+        if self.encoding == "binary":
+            # Room for the chunk header, filled in on flush.
+            self.buffer += b"\0" * BINARY_HEADER.size
+        else:
+            self.buffer += b"!START!"
+    def write(self, data):
+        self.buffer += data
+        for capture in self.captures:
+            capture.append(data)
+        if len(self.buffer) >= self.chunksize:
+            self.flush(False)
+    def flush(self, final):
+        if self.encoding == "binary":
+            BINARY_HEADER.pack_into(self.buffer, 0, BINARY_MAGIC, BINARY_VERSION, 0 if final else FLAG_MORE, len(self.buffer) - BINARY_HEADER.size)
+            self.sink(self.buffer, final)
+            del self.buffer[:]
+            if not final:
+                self.buffer += b"\0" * BINARY_HEADER.size
+        else:
+            if final:
+                self.buffer += b"!END!"
+            self.sink(self.buffer, final)
+            del self.buffer[:]
+
+# Compressions we can send, the server picks one by replying with a "compression" message.
+supported_compressions = ["none", "zlib"]
+# Dictionaries are the end of the last message sent before a compressed stream starts.
+COMPRESSION_DICTIONARY_SIZE = 32768
+# Python 2 (SFM) can't prime zlib with a dictionary.
+compression_dictionaries = sys.version_info >= (3, 3)
+
+# Streaming compression for a connection, FrameSender runs frames through it as they are sent.
+# One zlib stream runs for as long as compression stays on, so every frame is compressed
+# against the ones before it. The stream is flushed at the end of every message, so each
+# one can be decompressed as soon as its last packet arrives.
+# Packets: the binary frame header with COMPRESSED_MAGIC, the payload is the next part of
+# the stream. The decompressed stream is the messages as they would have been sent.
+class FrameCompressor(object):
+    def __init__(self, sink, level):
+        self.sink = sink
+        self.level = level
+        self.compression = "none"
+        self.compressor = None
+        self.flags = 0
+        # The end of the last message sent uncompressed, and of the one being sent.
+        self.tail = b""
+        self.current = b""
+    # Switch compression, only between messages.
+    def select(self, compression, dictionary):
+        if compression == self.compression:
+            return
+        # The first full frame is sent uncompressed to become the dictionary.
+        if compression == "zlib" and dictionary and compression_dictionaries and not self.tail:
+            return
+        self.compression = compression
+        self.compressor = None
+        if compression == "zlib":
+            self.flags = FLAG_RESET
+            if dictionary and compression_dictionaries and self.tail:
+                self.compressor = zlib.compressobj(self.level, zlib.DEFLATED, 15, 8, zlib.Z_DEFAULT_STRATEGY, self.tail)
+                self.flags |= FLAG_DICTIONARY
+            else:
+                self.compressor = zlib.compressobj(self.level)
+    # Compress the next part of a message, final ends it.
+    def write(self, data, final):
+        if self.compressor is None:
+            if compression_dictionaries:
+                self.current = (self.current + bytes(data))[-COMPRESSION_DICTIONARY_SIZE:]
+                if final:
+                    self.tail = self.current
+                    self.current = b""
+            self.sink(data, final)
+            return
+        data = self.compressor.compress(bytes(data))
+        if final:
+            data += self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        elif not data:
+            return
+        packet = bytearray(BINARY_HEADER.size)
+        BINARY_HEADER.pack_into(packet, 0, COMPRESSED_MAGIC, BINARY_VERSION, self.flags, len(data))
+        packet += data
+        self.flags = 0
+        self.sink(packet, final)
+
+# Attribute names repeat constantly, so their encodings are kept around.
+binary_keys = {}
+json_keys = {}
+
+def EncodeBinaryKey(name):
+    key = binary_keys.get(name)
+    if key is None:
+        data = name.encode("utf-8") if isinstance(name, text_type) else name
+        key = binary_keys[name] = struct.pack("<H", len(data)) + data
+    return key
+
+def EncodeJSONKey(name):
+    key = json_keys.get(name)
+    if key is None:
+        key = json_keys[name] = json.dumps(name).replace("!", "\\u0021").encode() + b":"
+    return key
+
+# Encode a stream of events into writer.
+def WriteEvents(events, writer):
+    if writer.encoding == "binary":
+        WriteBinaryEvents(events, writer)
     else:
-        # Unsupported elements:
-        # binary / binary_array
-        # time / time_array
-        # matrix / matrix_array
-        # TODO: Implement these types.
-        return False
+        WriteJSONEvents(events, writer)
+
+def WriteBinaryEvents(events, writer):
+    write = writer.write
+    # What closes each open object or list, and the cache entry being captured for it.
+    closers = []
+    for event in events:
+        kind = event[0]
+        if kind == EVENT_END:
+            closing, entry = closers.pop()
+            write(closing)
+            if entry is not None:
+                entry.binary = b"".join(writer.captures.pop())
+                subtree_cache.grow(entry, len(entry.binary))
+            continue
+        if event[1] is not None:
+            write(EncodeBinaryKey(event[1]))
+        if kind == EVENT_VALUE:
+            write(b"".join(EncodeBinary(event[2], [])))
+        elif kind == EVENT_ELEMENT:
+            entry = event[2] if isinstance(event[2], SubtreeCacheEntry) else None
+            if entry is not None:
+                writer.captures.append([])
+            closers.append((b"\xff\xff", entry))
+            write(struct.pack("<B", TAG_DICT_STREAM))
+        elif kind == EVENT_ARRAY:
+            closers.append((struct.pack("<B", TAG_END), None))
+            write(struct.pack("<B", TAG_LIST_STREAM))
+        else:
+            write(event[2])
+
+def WriteJSONEvents(events, writer):
+    write = writer.write
+    # Whether each open object or list (and the top level) already has an item.
+    separators = [False]
+    closers = []
+    for event in events:
+        kind = event[0]
+        if kind == EVENT_END:
+            separators.pop()
+            write(closers.pop())
+            continue
+        prefix = b"," if separators[-1] else b""
+        separators[-1] = True
+        if event[1] is not None:
+            prefix += EncodeJSONKey(event[1])
+        if kind == EVENT_VALUE:
+            # "!" never appears outside of a string in JSON, so escaping it there keeps "!END!" unique.
+            write(prefix + json.dumps(event[2], default=EncodeJSONDefault).replace("!", "\\u0021").encode())
+        elif kind == EVENT_ELEMENT:
+            separators.append(False)
+            closers.append(b"}")
+            write(prefix + b"{")
+        elif kind == EVENT_ARRAY:
+            separators.append(False)
+            closers.append(b"]")
+            write(prefix + b"[")
+
+# Turn a frame message into bytes ready to be sent in the given encoding.
+def EncodeFrame(framedata, encoding):
+    chunks = []
+    writer = FrameWriter(lambda chunk, final: chunks.append(bytes(chunk)), encoding)
+    writer.begin()
+    WriteEvents(WalkParsed(framedata, None, encoding == "binary"), writer)
+    writer.flush(True)
+    return b"".join(chunks)
+
+# Channels are skipped by the scene walk (see recursive_elements), curves exports
+# read their logs directly instead.
+channel_attributes = ["channel", "rightvaluechannel", "leftvaluechannel", "positionChannel", "orientationChannel"]
+
+# The value of an element's attribute, or None if it doesn't have it.
+def AttributeValue(element, name):
+    attribute = element.GetAttribute(name)
+    if attribute is None:
+        return None
+    return attribute.GetValue()
+
+# The items of an element's array attribute.
+def AttributeItems(element, name):
+    attribute = element.GetAttribute(name)
+    if attribute is None or attribute.GetValue() == None:
+        return []
+    values = attribute.GetValue()
+    return [values[i] for i in range(attribute.count()) if values[i] != None]
+
+def TimeSeconds(time):
+    if hasattr(time, "GetSeconds"):
+        return time.GetSeconds()
+    return float(time)
+
+# A clip's start, offset and scale, local time is (time - start) * scale + offset.
+def ClipTimeFrame(clip):
+    timeFrame = AttributeValue(clip, "timeFrame")
+    if timeFrame is None:
+        return 0.0, 0.0, 1.0
+    scale = AttributeValue(timeFrame, "scale")
+    return TimeSeconds(AttributeValue(timeFrame, "start")), TimeSeconds(AttributeValue(timeFrame, "offset")), scale if scale else 1.0
+
+# Every channel driven by the clip's animation set controls:
+# (animation set name, control name, channel attribute name, channel)
+def FindChannels(clip):
+    channels = []
+    for animationSet in AttributeItems(clip, "animationSets"):
+        for control in AttributeItems(animationSet, "controls"):
+            for name in channel_attributes:
+                channel = AttributeValue(control, name)
+                if channel != None:
+                    channels.append((animationSet.GetValue("name"), control.GetValue("name"), name, channel))
+    return channels
+
+# The keyframes of a channel's base log layer between starttime and endtime (in seconds),
+# plus the keyframe on either side so the receiver can interpolate up to the edges.
+def ParseChannel(channel, starttime, endtime):
+    log = AttributeValue(channel, "log")
+    if log == None:
+        return None
+    layers = AttributeItems(log, "layers")
+    if not layers:
+        return None
+    times = layers[0].GetAttribute("times")
+    values = layers[0].GetAttribute("values")
+    if times is None or values is None or values.GetTypeString() not in packed_types:
+        return None
+    count = min(times.count(), values.count())
+    keytimes = times.GetValue()
+    seconds = [TimeSeconds(keytimes[i]) for i in range(count)]
+    first = 0
+    while first + 1 < count and seconds[first + 1] <= starttime:
+        first += 1
+    last = first
+    while last < count and seconds[last] < endtime:
+        last += 1
+    last = min(last + 1, count)
+    if last <= first:
+        return None
+    parsed = {}
+    toElement = AttributeValue(channel, "toElement")
+    if toElement != None:
+        parsed["toElement"] = toElement.GetValue("name")
+    parsed["toAttribute"] = AttributeValue(channel, "toAttribute")
+    parsed["times"] = PackArray("float_array", seconds[first:last], last - first)
+    value = values.GetValue()
+    parsed["values"] = PackArray(values.GetTypeString(), [value[i] for i in range(first, last)], last - first)
+    return parsed
+
+# The attributes animated in a clip, for scene streams.
+# Every element gets a numeric id and every animated attribute name a key id. After the
+# scene has been sent once, frames only carry a table of (element id, key id, value)
+# for the animated attributes that changed.
+class SceneTable(object):
+    def __init__(self, clip):
+        self.clipKey = ElementKey(clip)
+        self.sequence = None
+        # Element key to element id, ids start at 1.
+        self.ids = {}
+        # Key id to attribute name, and back.
+        self.keys = []
+        self.keyIds = {}
+        # Animated attributes: [element, attribute name, element id, key id, parser]
+        self.targets = []
+        # (element id, key id) of every target.
+        targeted = set()
+        # Last value sent for each (element id, key id).
+        self.values = {}
+        for animationSet, control, name, channel in FindChannels(clip):
+            element = AttributeValue(channel, "toElement")
+            attribute = AttributeValue(channel, "toAttribute")
+            if element == None or not attribute:
+                continue
+            elementId = self.elementId(element)
+            keyId = self.keyIds.get(attribute)
+            if keyId is None:
+                keyId = self.keyIds[attribute] = len(self.keys)
+                self.keys.append(attribute)
+            # Several channels can drive the same attribute (e.g. one flex weight each).
+            if (elementId, keyId) not in targeted:
+                targeted.add((elementId, keyId))
+                self.targets.append([element, attribute, elementId, keyId, None])
+    def elementId(self, element):
+        return self.ids.setdefault(ElementKey(element), len(self.ids) + 1)
+    # What the scene message says about each animated attribute.
+    def describe(self):
+        return [{"element": target[2], "key": target[3], "name": target[0].GetValue("name")} for target in self.targets]
+    # Walk the clip like a keyframe, with every element's id added as "@id".
+    def walk(self, clip, subscription):
+        for event in WalkElement(clip, None, "filmClip", subscription):
+            yield event
+            if event[0] == EVENT_ELEMENT:
+                yield (EVENT_VALUE, "@id", self.elementId(event[2]))
+    # The animated attributes that changed since the last table.
+    def table(self):
+        elements = []
+        keys = []
+        values = []
+        for target in self.targets:
+            attribute = target[0].GetAttribute(target[1])
+            if attribute is None:
+                continue
+            # Animated attributes are often skipped by the scene walk (flexWeights),
+            # so they are looked up without recursive_elements.
+            if target[4] is None:
+                target[4] = attribute_parsers.get(attribute.GetTypeString()) or ParseScalarAttribute
+            value = target[4](attribute, attribute.GetValue())
+            if value is None or self.values.get((target[2], target[3])) == value:
+                continue
+            self.values[(target[2], target[3])] = value
+            elements.append(target[2])
+            keys.append(target[3])
+            values.append(value)
+        return {
+            "elements": PackArray("int_array", elements, len(elements)),
+            "keys": PackArray("int_array", keys, len(keys)),
+            "values": values
+        }
+
+# How long an export waits for the server to acknowledge frames before giving up, in seconds.
+export_ack_timeout = 30
+
+# How often live update checks for a server again while none is connected, in seconds.
+live_retry_delay = 1.0
+
+# What to do with a frame when the send queue is full:
+# block waits for room, drop-oldest throws away the oldest queued frame that wasn't
+# queued as never-drop, never-drop waits for room and is never thrown away.
+queue_policies = ["block", "drop-oldest", "never-drop"]
+
+# How long connecting to a server may take, in seconds.
+connect_timeout = 5
 
-def ParseElement(dag, parent):
-    dag_parsed = {}
-    dag_element = dag.FirstAttribute()
-    ParseAttribute(dag_element, dag_parsed, dag, parent)
-    for i in range(128):
-        dag_element = dag_element.NextAttribute()
-        if dag_element is None:
-            break
-        ParseAttribute(dag_element, dag_parsed, dag, parent)
-    return dag_parsed
+# A server that can't be reached is retried after the first delay, doubling up to the second (seconds).
+reconnect_delays = (0.5, 30.0)
+
+# Servers to connect to from "host:port" entries separated by commas, missing parts use the defaults.
+def ParseAddresses(text, host="localhost", port=9191):
+    addresses = []
+    for entry in text.split(","):
+        hostport = entry.strip().split(":", 1)
+        if hostport[0] or len(hostport) > 1:
+            addresses.append((hostport[0] or host, int(hostport[1] or port) if len(hostport) > 1 else port))
+    return addresses or [(host, port)]
+
+# A frame on its way to one server. Chunks are added as the FrameWriter produces them and
+# the sender sends them as they arrive, so a frame starts going out before it is fully
+# read and isn't kept whole in memory. Until the sender picks it up the frame is still
+# in the queue and can be dropped as a whole.
+class QueuedFrame(object):
+    def __init__(self, droppable):
+        self.droppable = droppable
+        # (data, final) pairs not sent yet.
+        self.chunks = collections.deque()
+        self.size = 0
+        # Set once the last chunk is added, or the frame couldn't be finished.
+        self.done = False
+        self.aborted = False
+
+# Owns the connection to one server and sends to it from its own thread, so SFM can keep
+# reading the scene while earlier frames are still going out, and a slow server only
+# holds up its own queue. Frames wait in a bounded queue and are compressed as they are
+# sent, with the compression this server asked for.
+# When the connection breaks, the queue is thrown away and the thread reconnects with
+# exponential backoff. Frames are only queued once the session knows the server needs a
+# keyframe again (see synced and SFM_BRIDGE_API.poll).
+class FrameSender(object):
+    def __init__(self, address, maxframes, compression, dictionary, level):
+        self.address = address
+        self.name = address[0] + ":" + str(address[1])
+        self.maxframes = maxframes
+        self.level = level
+        # The compression set from the start, each new connection starts with it.
+        self.defaults = (compression, dictionary)
+        self.client = None
+        # Set by the thread while the connection is up.
+        self.connected = False
+        # Set by the session once it sends this server's frames, after a (re)connect.
+        self.synced = False
+        # QueuedFrames waiting to be sent, not counting the one being sent.
+        self.queue = collections.deque()
+        self.condition = threading.Condition()
+        self.running = True
+        # Why the last connection attempt failed or the connection broke.
+        self.error = None
+        self.retryAt = 0
+        self.delay = reconnect_delays[0]
+        self.reconnects = 0
+        self.sentFrames = 0
+        self.sentBytes = 0
+        self.droppedFrames = 0
+        # Progress of the frame currently being sent.
+        self.sendingBytes = 0
+        self.sendingSize = 0
+        # Read by SFM_BRIDGE_API.poll on the main thread.
+        self.received = b""
+        self.acked = 0
+        self.acksSupported = False
+        try:
+            self.connect()
+            self.synced = True
+        except socket.error as error:
+            self.failed(error)
+        self.thread = threading.Thread(target=self.run, name="SFM Bridge Sender " + self.name)
+        self.thread.daemon = True
+        self.thread.start()
+    def connect(self):
+        client = socket.create_connection(self.address, connect_timeout)
+        client.settimeout(None)
+        with self.condition:
+            self.client = client
+            self.connected = True
+            self.error = None
+            self.delay = reconnect_delays[0]
+            self.received = b""
+            self.acksSupported = False
+            self.compression, self.dictionary = self.defaults
+            # A new connection is a new compressed stream.
+            self.packets = []
+            self.compressor = FrameCompressor(self.collect, self.level)
+    # FrameCompressor sink, packets are sent after every chunk.
+    def collect(self, data, final):
+        self.packets.append(data)
+    # A connection attempt failed, try again after the current delay.
+    def failed(self, error):
+        self.error = error
+        self.retryAt = time.time() + self.delay
+        self.delay = min(self.delay * 2, reconnect_delays[1])
+    # Drop the connection client if it is still the current one, the thread reconnects.
+    def disconnect(self, client, error):
+        with self.condition:
+            if client is not self.client or not self.connected:
+                return
+            self.connected = False
+            self.synced = False
+            self.queue.clear()
+            self.failed(error)
+            self.condition.notify_all()
+        try:
+            client.close()
+        except socket.error:
+            pass
+    # Queue a frame before its chunks are added, returns False if it couldn't be (the
+    # sender has stopped or isn't synced, frames for a server that isn't are thrown away).
+    def open(self, frame, policy):
+        with self.condition:
+            while self.running and self.synced and len(self.queue) >= self.maxframes:
+                if policy == "drop-oldest":
+                    for queued in self.queue:
+                        if queued.droppable:
+                            self.queue.remove(queued)
+                            self.droppedFrames += 1
+                            break
+                    else:
+                        self.condition.wait()
+                else:
+                    self.condition.wait()
+            if not self.running or not self.synced:
+                return False
+            self.queue.append(frame)
+            self.condition.notify_all()
+            return True
+    def add(self, frame, data, final):
+        with self.condition:
+            # The connection broke since, the frame was thrown away with the queue.
+            if not self.synced:
+                return
+            frame.chunks.append((data, final))
+            frame.size += len(data)
+            frame.done = final
+            self.condition.notify_all()
+    def abort(self, frame):
+        with self.condition:
+            frame.aborted = True
+            frame.done = True
+            self.condition.notify_all()
+    # Send the chunks of a frame as they are added, returns False if the connection broke.
+    def sendFrame(self, frame, client):
+        sending = 0
+        while True:
+            with self.condition:
+                while self.connected and not frame.chunks and not frame.done:
+                    self.condition.wait()
+                if not self.connected:
+                    return False
+                self.sendingSize = frame.size
+                if not frame.chunks:
+                    # Abandoned while being encoded, the part already sent can't be taken
+                    # back so the server gets a new connection and a keyframe.
+                    if self.sendingBytes > 0:
+                        self.disconnect(client, socket.error("a frame couldn't be finished"))
+                        return False
+                    return True
+                chunk, final = frame.chunks.popleft()
+            if frame_stats.enabled:
+                started = stats_clock()
+            try:
+                self.compressor.write(chunk, final)
+                for packet in self.packets:
+                    client.sendall(packet)
+                    self.sentBytes += len(packet)
+                del self.packets[:]
+            except socket.error as error:
+                del self.packets[:]
+                self.disconnect(client, error)
+                return False
+            if frame_stats.enabled:
+                sending += stats_clock() - started
+            self.sendingBytes += len(chunk)
+            if final:
+                if frame_stats.enabled:
+                    # Only the time spent sending, not waiting for chunks.
+                    frame_stats.span("socket", stats_clock() - sending)
+                return True
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and self.connected and not self.queue:
+                    self.condition.wait()
+                reconnect = not self.connected
+                if reconnect:
+                    if not self.running:
+                        return
+                    # Woken early by stop or a spurious wakeup, wait out the rest.
+                    remaining = self.retryAt - time.time()
+                    if remaining > 0:
+                        self.condition.wait(remaining)
+                        continue
+                # Whatever was queued before stopping is still sent.
+                elif not self.queue:
+                    return
+                else:
+                    frame = self.queue.popleft()
+                    self.sendingBytes = 0
+                    self.sendingSize = frame.size
+                    client = self.client
+                    self.condition.notify_all()
+            if reconnect:
+                try:
+                    self.connect()
+                    self.reconnects += 1
+                except socket.error as error:
+                    self.failed(error)
+                continue
+            self.compressor.select(self.compression, self.dictionary)
+            if self.sendFrame(frame, client) and not frame.aborted:
+                self.sentFrames += 1
+    # Stop accepting frames, wait (up to timeout seconds) for queued ones to go out and close the connection.
+    def stop(self, timeout):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join(timeout)
+        with self.condition:
+            client = self.client
+            self.client = None
+            self.connected = False
+            self.synced = False
+        if client is not None:
+            client.close()
+    def status(self):
+        if not self.connected:
+            if self.error is None:
+                return "Disconnected."
+            return "Reconnecting in " + str(max(0, int(round(self.retryAt - time.time())))) + "s: " + str(self.error) + "."
+        text = "Queue " + str(len(self.queue)) + "/" + str(self.maxframes) + ", sent " + str(self.sentFrames) + " frames (" + str(self.sentBytes // 1024) + " KB)"
+        if self.sendingSize > self.sendingBytes:
+            text += ", sending " + str(self.sendingBytes // 1024) + "/" + str(self.sendingSize // 1024) + " KB"
+        if self.droppedFrames > 0:
+            text += ", dropped " + str(self.droppedFrames)
+        if self.reconnects > 0:
+            text += ", reconnected " + str(self.reconnects) + "x"
+        return text + "."
+
+# The servers a session sends to. Every frame is encoded once, from a FrameWriter, and the
+# same chunks are added to every server's queue as they are produced (see FrameSender).
+class SenderPool(object):
+    def __init__(self, addresses, maxframes, compression, dictionary, level):
+        self.senders = [FrameSender(address, maxframes, compression, dictionary, level) for address in addresses]
+        # (sender, QueuedFrame) of the frame being written.
+        self.pending = []
+        self.queuedBytes = 0
+        self.running = True
+    # Servers the session is sending to.
+    def synced(self):
+        return [sender for sender in self.senders if sender.synced]
+    def setMaxFrames(self, maxframes):
+        for sender in self.senders:
+            sender.maxframes = maxframes
+    # Queue a frame for every synced server before a FrameWriter writes it, this waits
+    # for room in the queues, see queue_policies.
+    def begin(self, policy):
+        self.pending = []
+        for sender in self.senders:
+            frame = QueuedFrame(policy != "never-drop")
+            if sender.open(frame, policy):
+                self.pending.append((sender, frame))
+    # FrameWriter sink, the buffer is reused so chunks are copied.
+    def write(self, data, final):
+        data = bytes(data)
+        self.queuedBytes += len(data)
+        for sender, frame in self.pending:
+            sender.add(frame, data, final)
+        if final:
+            self.pending = []
+    # The frame being written couldn't be finished.
+    def abort(self):
+        for sender, frame in self.pending:
+            sender.abort(frame)
+        self.pending = []
+    def stop(self, timeout):
+        self.running = False
+        deadline = time.time() + timeout
+        for sender in self.senders:
+            with sender.condition:
+                sender.running = False
+                sender.condition.notify_all()
+        for sender in self.senders:
+            sender.stop(max(0, deadline - time.time()))
+    def status(self):
+        if len(self.senders) == 1:
+            return self.senders[0].status()
+        return " ".join([sender.name + ": " + sender.status() for sender in self.senders])
+
+# The fields every message starts with, apart from its sequence number.
+def MessageFields(type):
+    message = {}
+    message["type"] = type
+    message["version"] = SFM_BRIDGE_VERSION
+    message["project"] = sfmApp.GetMovie().GetValue("name")
+    message["map"] = sfmApp.GetMovie().GetValue("mapname")
+    message["from"] = "SFM Bridge"
+    message["frameRate"] = sfmApp.GetFramesPerSecond()
+    message["encodings"] = supported_encodings
+    message["compressions"] = supported_compressions
+    return message
+
+# Frame archives hold an export on disk, so it can be replayed to servers later without SFM.
+# Layout: the header, the scene (an "archive" message describing the export), the index
+# (one fixed-size entry per frame from the start frame to the end frame) and the frames.
+# Frames and the scene are stored exactly as they would be sent, uncompressed. Every frame
+# is a keyframe, so each one can be read on its own.
+# Keep these in sync with tools/sfm_bridge_archive.py.
+ARCHIVE_MAGIC = b"SFMBARCH"
+ARCHIVE_VERSION = 1
+# Magic, version, encoding (index in supported_encodings), flags (unused), frame rate,
+# start frame, frame count, scene offset, scene length, index offset.
+ARCHIVE_HEADER = struct.Struct("<8sHBBdiIQQQ")
+# Frame number, flags, offset and length of the frame in the file.
+ARCHIVE_INDEX_ENTRY = struct.Struct("<iIQQ")
+# Set on index entries of frames that were written, an interrupted export leaves the rest unset.
+ARCHIVE_FRAME_PRESENT = 1
+
+class FrameArchive(object):
+    def __init__(self, path, startframe, endframe, encoding):
+        self.file = open(path, "wb")
+        self.encoding = encoding
+        self.startframe = startframe
+        self.count = max(endframe - startframe + 1, 0)
+        self.sequence = 0
+        self.entries = [(startframe + i, 0, 0, 0) for i in range(self.count)]
+        # Frames are written as they are encoded, the sink only tracks where they end up.
+        self.writer = FrameWriter(lambda data, final: self.file.write(data), encoding)
+        self.file.write(b"\0" * ARCHIVE_HEADER.size)
+        self.sceneOffset = self.file.tell()
+        scene = self.message("archive")
+        scene["startFrame"] = startframe
+        scene["endFrame"] = endframe
+        self.write(scene, None)
+        self.sceneLength = self.file.tell() - self.sceneOffset
+        # Room for the index, filled in on close.
+        self.indexOffset = self.file.tell()
+        self.file.write(b"\0" * (ARCHIVE_INDEX_ENTRY.size * self.count))
+    def message(self, type):
+        message = MessageFields(type)
+        self.sequence += 1
+        message["sequence"] = self.sequence
+        return message
+    def write(self, message, events):
+        self.writer.begin()
+        WriteEvents(WalkFrame(message, events, self.encoding == "binary"), self.writer)
+        self.writer.flush(True)
+    # Write a frame, the playhead should already be on it.
+    def frame(self, startframe):
+        position = startframe - self.startframe
+        if position < 0 or position >= self.count:
+            return False
+        curtime = vs.DmeTime_t(((1.0/sfmApp.GetFramesPerSecond())*startframe))
+        clip = sfmApp.GetMovie().FindOrCreateFilmTrack().FindFilmClipAtTime(curtime)
+        framedata = self.message("framecommit")
+        framedata["currentFrame"] = startframe
+        framedata["keyframe"] = True
+        offset = self.file.tell()
+        # Nothing is kept between frames, so the film clip is streamed straight to the file.
+        self.write(framedata, WalkElement(clip, None, "filmClip") if clip is not None else None)
+        self.entries[position] = (startframe, ARCHIVE_FRAME_PRESENT, offset, self.file.tell() - offset)
+        return True
+    def close(self):
+        self.file.seek(self.indexOffset)
+        for entry in self.entries:
+            self.file.write(ARCHIVE_INDEX_ENTRY.pack(*entry))
+        self.file.seek(0)
+        self.file.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, supported_encodings.index(self.encoding), 0, sfmApp.GetFramesPerSecond(), self.startframe, self.count, self.sceneOffset, self.sceneLength, self.indexOffset))
+        self.file.close()
 
 # This class is used for other scripts to interface with SFM Bridge.
 # It should never be initialized outside of this script.
@@ -177,16 +1429,85 @@ class SFM_BRIDGE_API:
         else:
             sfm.Msg("SFM Bridge is starting...\n")
             globals()["SFM_BRIDGE"] = self
-        # Create a client for communication.
-        self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        # Connect to the server, likely Garry's Mod.
+        # The servers to send to, likely Garry's Mod, separated by commas.
+        if "SFM_BRIDGE_TAB_WINDOW" in globals():
+            addresses = ParseAddresses(str(SFM_BRIDGE_TAB_WINDOW.ip.text()))
+        else:
+            addresses = ParseAddresses(os.environ.get("SFM_BRIDGE_TCP_IP") or "localhost", port=int(os.environ.get("SFM_BRIDGE_TCP_PORT") or 9191))
+        # Delta frames only send what changed since the last frame.
+        # A keyframe (the full film clip) is sent first, every keyframeInterval frames,
+        # and whenever the server asks for a resync.
+        if "SFM_BRIDGE_TAB_WINDOW" in globals():
+            self.deltaFrames = SFM_BRIDGE_TAB_WINDOW.deltaFrames.isChecked()
+            self.keyframeInterval = SFM_BRIDGE_TAB_WINDOW.keyframeInterval.value()
+        else:
+            self.deltaFrames = os.environ.get("SFM_BRIDGE_DELTA") == "1"
+            self.keyframeInterval = int(os.environ.get("SFM_BRIDGE_KEYFRAME_INTERVAL") or 0)
+        # Unchanged subtrees are reused from previous frames, up to this many megabytes.
+        if "SFM_BRIDGE_TAB_WINDOW" in globals():
+            subtree_cache.budget = SFM_BRIDGE_TAB_WINDOW.cacheBudget.value() * 1024 * 1024
+        else:
+            subtree_cache.budget = int(os.environ.get("SFM_BRIDGE_CACHE_MB") or 64) * 1024 * 1024
+        self.lastFilmClip = None
+        self.framesSinceKeyframe = 0
+        self.resync = True
+        # Scene streams replace keyframes and delta frames, see SceneTable.
+        if "SFM_BRIDGE_TAB_WINDOW" in globals():
+            self.sceneStream = SFM_BRIDGE_TAB_WINDOW.sceneStream.isChecked()
+        else:
+            self.sceneStream = os.environ.get("SFM_BRIDGE_SCENE_STREAM") == "1"
+        self.sceneTable = None
+        # Only walk the parts of the film clip the server subscribed to, see CompileSubscription.
+        self.subscription = CompileSubscription([path for path in os.environ.get("SFM_BRIDGE_SUBSCRIBE", "").split(",") if path])
+        # The playhead frame of the last frame sent.
+        self.lastFrame = None
+        # Set while no server is connected, so that is only logged once.
+        self.offline = False
+        # Instrumentation, see FrameStats.
         if "SFM_BRIDGE_TAB_WINDOW" in globals():
-            ipport = str(SFM_BRIDGE_TAB_WINDOW.ip.text()).split(":", 1)
-            ip = ipport[0] or "localhost"
-            port = int(ipport[1]) or 9191
-            self.client.connect((ip, port))
+            frame_stats.enabled = SFM_BRIDGE_TAB_WINDOW.instrumentation.isChecked()
+            self.sendStats = SFM_BRIDGE_TAB_WINDOW.sendStats.isChecked()
         else:
-            self.client.connect((os.environ.get("SFM_BRIDGE_TCP_IP") or "localhost", os.environ.get("SFM_BRIDGE_TCP_PORT") or 9191))
+            frame_stats.enabled = os.environ.get("SFM_BRIDGE_STATS") == "1"
+            self.sendStats = os.environ.get("SFM_BRIDGE_SEND_STATS") == "1"
+        self.statsDue = 0
+        # Every frame gets a sequence number, servers can acknowledge them to pace exports.
+        # acked is the lowest acknowledged sequence of the servers that acknowledge frames.
+        self.sequence = 0
+        self.acked = 0
+        self.acksSupported = False
+        # Frames start out as JSON unless told otherwise, the server can switch us over
+        # to any of the encodings listed in the "encodings" field of our frames.
+        self.encoding = os.environ.get("SFM_BRIDGE_ENCODING") or "json"
+        if self.encoding not in supported_encodings:
+            sfm.Msg("SFM Bridge does not support the " + self.encoding + " encoding, using json.\n")
+            self.encoding = "json"
+        # Frames are sent from a separate thread, framecommit frames are never dropped.
+        if "SFM_BRIDGE_TAB_WINDOW" in globals():
+            self.queuePolicy = queue_policies[SFM_BRIDGE_TAB_WINDOW.queuePolicy.currentIndex()]
+            queueSize = SFM_BRIDGE_TAB_WINDOW.queueSize.value()
+        else:
+            self.queuePolicy = os.environ.get("SFM_BRIDGE_QUEUE_POLICY") or "block"
+            queueSize = int(os.environ.get("SFM_BRIDGE_QUEUE_SIZE") or 8)
+        if self.queuePolicy not in queue_policies:
+            sfm.Msg("SFM Bridge does not support the " + self.queuePolicy + " queue policy, using block.\n")
+            self.queuePolicy = "block"
+        # Compression is off unless a server asks for it, or SFM_BRIDGE_COMPRESSION is
+        # set for servers that expect it from the start.
+        compression = os.environ.get("SFM_BRIDGE_COMPRESSION") or "none"
+        if compression not in supported_compressions:
+            sfm.Msg("SFM Bridge does not support the " + compression + " compression, using none.\n")
+            compression = "none"
+        dictionary = os.environ.get("SFM_BRIDGE_COMPRESSION_DICTIONARY") == "1"
+        # Connect to every server, the ones that can't be reached are retried in the background.
+        self.pool = SenderPool(addresses, queueSize, compression, dictionary, int(os.environ.get("SFM_BRIDGE_COMPRESSION_LEVEL") or 6))
+        if not self.pool.synced():
+            self.pool.stop(0)
+            raise self.pool.senders[0].error
+        for sender in self.pool.senders:
+            if not sender.synced:
+                sfm.Msg("SFM Bridge couldn't connect to " + sender.name + ", retrying in the background: " + str(sender.error) + "\n")
+        self.writer = FrameWriter(self.pool.write, self.encoding)
         # Send a cute message to the server.
         #self.client.send(("Hello from SFM! I'm SFM Bridge version v" + SFM_BRIDGE_VERSION + " running on SFM v" + sfmApp.Version() + ". My current project is " + sfmApp.GetMovie().GetValue("name") + " on map " + sfmApp.GetMovie().GetValue("mapname")).encode())
         # Close SFM Bridge when the script is closed.
@@ -195,30 +1516,283 @@ class SFM_BRIDGE_API:
         self.frame("framedata", sfmApp.GetHeadTimeInFrames())
     def close(self):
         sfm.Msg("SFM Bridge is closing...\n")
-        self.client.close()
+        self.pool.stop(5)
+        subtree_cache.clear()
         sfm.Msg("SFM Bridge has closed.\n")
         del globals()["SFM_BRIDGE"]
-    # Frame request
-    def frame(self, type, startframe): # currently supported types by protocol: framedata, framecommit
-        framedata = {}
-        framedata["type"] = type
-        framedata["version"] = SFM_BRIDGE_VERSION
-        framedata["project"] = sfmApp.GetMovie().GetValue("name")
-        framedata["map"] = sfmApp.GetMovie().GetValue("mapname")
-        framedata["from"] = "SFM Bridge"
-        framedata["currentFrame"] = startframe
-        framedata["frameRate"] = sfmApp.GetFramesPerSecond()
+    # Read any messages the servers sent us without blocking.
+    # Currently supported types by protocol: resync, encoding, ack, subscribe, compression
+    def poll(self):
+        for sender in self.pool.senders:
+            # A server that (re)connected gets frames again, starting with a keyframe.
+            if sender.connected and not sender.synced:
+                sender.acked = self.sequence
+                sender.synced = True
+                self.resync = True
+                sfm.Msg("SFM Bridge connected to " + sender.name + ".\n")
+        synced = self.pool.synced()
+        clients = [sender.client for sender in synced]
+        try:
+            readable = select.select(clients, [], [], 0)[0] if clients else []
+        except (socket.error, ValueError):
+            # A connection was closed by its sender thread, it is picked up next time.
+            readable = []
+        for sender in synced:
+            client = sender.client
+            if client not in readable:
+                continue
+            try:
+                data = client.recv(4096)
+            except (socket.error, ValueError) as error:
+                sender.disconnect(client, error)
+                continue
+            if not data:
+                sender.disconnect(client, "closed by the server")
+                continue
+            sender.received += data
+            self.handleMessages(sender)
+        acking = [sender.acked for sender in self.pool.synced() if sender.acksSupported]
+        self.acksSupported = len(acking) > 0
+        if acking:
+            self.acked = min(acking)
+    # Handle the complete messages a server sent.
+    def handleMessages(self, sender):
+        while b"!END!" in sender.received:
+            message, sender.received = sender.received.split(b"!END!", 1)
+            if not message.startswith(b"!START!"):
+                continue
+            try:
+                message = json.loads(message[len(b"!START!"):].decode("utf-8"))
+            except ValueError:
+                sfm.Msg("SFM Bridge received a malformed message from " + sender.name + ".\n")
+                continue
+            if message.get("type") == "resync":
+                self.resync = True
+            elif message.get("type") == "encoding":
+                if message.get("encoding") in supported_encodings:
+                    self.encoding = message.get("encoding")
+                else:
+                    sfm.Msg("SFM Bridge was asked for an unsupported encoding, ignoring.\n")
+            elif message.get("type") == "compression":
+                # Every server has its own compressed stream.
+                if message.get("compression") in supported_compressions:
+                    sender.compression = message.get("compression")
+                    sender.dictionary = bool(message.get("dictionary"))
+                else:
+                    sfm.Msg("SFM Bridge was asked for an unsupported compression, ignoring.\n")
+            elif message.get("type") == "ack":
+                # Acks are cumulative, every frame up to this sequence number was received.
+                sender.acked = max(sender.acked, int(message.get("sequence", 0)))
+                sender.acksSupported = True
+            elif message.get("type") == "subscribe":
+                paths = message.get("paths")
+                if paths is None or (type(paths) is list and all(isinstance(path, text_type) for path in paths)):
+                    self.subscription = CompileSubscription(paths)
+                    # The film clip changes shape, so the next frame is a keyframe.
+                    self.resync = True
+                else:
+                    sfm.Msg("SFM Bridge received a malformed subscription, ignoring.\n")
+    # Wait until at most limit frames are unacknowledged by every server that acknowledges frames.
+    # Returns False if that didn't happen within timeout seconds or those connections are gone.
+    # With firstAck, servers that haven't acknowledged anything yet are waited on too, so
+    # they have until timeout to send their first ack.
+    def waitForAcks(self, limit, timeout, firstAck=False):
+        deadline = time.time() + timeout
+        self.poll()
+        while self.sequence - self.acked > limit:
+            remaining = deadline - time.time()
+            clients = [sender.client for sender in self.pool.synced() if sender.acksSupported or firstAck]
+            if remaining <= 0 or not clients:
+                return False
+            try:
+                select.select(clients, [], [], min(remaining, 0.1))
+            except (socket.error, ValueError):
+                pass
+            self.poll()
+        return True
+    # Frame request, returns the frame's sequence number or None if it couldn't be sent
+    # With changedOnly, nothing is sent and False is returned if the playhead and the scene
+    # are the same as in the last frame sent, live update uses this to skip idle frames.
+    def frame(self, type, startframe, changedOnly=False): # currently supported types by protocol: framedata, framecommit
+        if not frame_stats.enabled:
+            return self.buildFrame(type, startframe, changedOnly)
+        started = stats_clock()
+        sequence = self.buildFrame(type, startframe, changedOnly)
+        frame_stats.span("frame", started)
+        if sequence:
+            frame_stats.frames += 1
+        if self.sendStats and stats_clock() >= self.statsDue:
+            self.statsDue = stats_clock() + stats_interval
+            stats = self.message("stats")
+            stats["stats"] = frame_stats.summary()
+            self.send(stats, None, self.queuePolicy)
+        return sequence
+    # The subtree cache only pays off when unchanged subtrees are skipped, by delta frames
+    # or by reusing their binary encoding. Otherwise every attribute is still read and the
+    # cache only adds bookkeeping.
+    def cacheActive(self):
+        return subtree_cache.budget > 0 and (self.deltaFrames or self.encoding == "binary")
+    # Whether any server gets frames, nothing is read from the scene while none does.
+    def online(self):
+        if not self.pool.synced():
+            # Servers that reconnected are picked up by poll.
+            self.poll()
+            if not self.pool.synced():
+                if not self.offline:
+                    sfm.Msg("SFM Bridge can't send frames, no server is connected.\n")
+                    self.offline = True
+                return False
+        self.offline = False
+        return True
+    def buildFrame(self, type, startframe, changedOnly):
+        if not self.pool.running or not self.online():
+            return None
+        # Timings are only taken when instrumentation is enabled, see FrameStats.
+        stats = frame_stats if frame_stats.enabled else None
+        if stats is not None:
+            started = stats_clock()
         # Parse elements into something we can send.
+        clip = None
         if sfmApp.GetMovie() is not None:
             sfmApp.SetHeadTimeInFrames(startframe)
             # This gets the current clip at the playhead.
             curtime = vs.DmeTime_t(((1.0/sfmApp.GetFramesPerSecond())*startframe))
-            # Parse it over.
-            if sfmApp.GetMovie().FindOrCreateFilmTrack().FindFilmClipAtTime(curtime) is not None:
-                framedata["filmClip"] = ParseElement(sfmApp.GetMovie().FindOrCreateFilmTrack().FindFilmClipAtTime(curtime), None)
-        # Send framedata to server via json.
-        self.client.send("!START!" + json.dumps(framedata).encode() + "!END!")
-
+            clip = sfmApp.GetMovie().FindOrCreateFilmTrack().FindFilmClipAtTime(curtime)
+        if stats is not None:
+            stats.span("scrub", started)
+        policy = "never-drop" if type == "framecommit" else self.queuePolicy
+        # Scene streams send the scene once, frames only carry the animated attributes.
+        if self.sceneStream:
+            self.poll()
+            if clip is not None and (self.resync or self.sceneTable is None or self.sceneTable.clipKey != ElementKey(clip)):
+                if self.handshake(clip) is None:
+                    return None
+            table = None
+            if clip is not None:
+                if stats is not None:
+                    started = stats_clock()
+                table = self.sceneTable.table()
+                if stats is not None:
+                    stats.span("walk", started)
+                if changedOnly and startframe == self.lastFrame and not table["values"]:
+                    return False
+            framedata = self.message(type)
+            framedata["currentFrame"] = startframe
+            if table is not None:
+                framedata["scene"] = self.sceneTable.sequence
+                framedata["table"] = table
+            self.lastFrame = startframe
+            return self.send(framedata, None, policy)
+        # A subscription changes what is walked, so it is read first.
+        self.poll()
+        # Without delta frames or an active subtree cache nothing is kept between frames,
+        # so the film clip is streamed straight from the scene to the server.
+        filmClip = None
+        events = None
+        if clip is not None:
+            if not self.deltaFrames and not self.cacheActive() and not changedOnly:
+                # The walk happens while encoding, so it is timed as part of "encode".
+                events = WalkElement(clip, None, "filmClip", self.subscription)
+            else:
+                if stats is not None:
+                    started = stats_clock()
+                # Parse it over.
+                filmClip = ParseElement(clip, None, self.subscription, self.cacheActive())
+                if stats is not None:
+                    stats.span("walk", started)
+        changes = None
+        # Without delta frames a moved playhead is sent anyway, only a still one needs the
+        # diff to tell whether anything changed. The film clip is still parsed for that.
+        if (self.deltaFrames or (changedOnly and startframe == self.lastFrame)) and self.lastFilmClip is not None and filmClip is not None:
+            if stats is not None:
+                started = stats_clock()
+            changes = DiffParsed(self.lastFilmClip, filmClip, [], {"added": [], "changed": [], "removed": []})
+            if stats is not None:
+                stats.span("diff", started)
+            if changedOnly and startframe == self.lastFrame and not self.resync and not (changes["added"] or changes["changed"] or changes["removed"]):
+                return False
+        framedata = self.message(type)
+        framedata["currentFrame"] = startframe
+        # Decide between a keyframe and a delta against the last frame we sent.
+        keyframe = not self.deltaFrames or self.resync or changes is None
+        if self.keyframeInterval > 0 and self.framesSinceKeyframe >= self.keyframeInterval:
+            keyframe = True
+        framedata["keyframe"] = keyframe
+        if keyframe:
+            if filmClip is not None:
+                framedata["filmClip"] = filmClip
+            self.framesSinceKeyframe = 0
+            self.resync = False
+        else:
+            framedata["changes"] = changes
+        self.framesSinceKeyframe += 1
+        self.lastFilmClip = filmClip
+        self.lastFrame = startframe
+        return self.send(framedata, events, policy)
+    # Send the scene structure with element ids and the attribute keys used by scene stream frames.
+    def handshake(self, clip):
+        self.sceneTable = SceneTable(clip)
+        self.resync = False
+        scene = self.message("scene")
+        scene["keys"] = self.sceneTable.keys
+        scene["targets"] = self.sceneTable.describe()
+        self.sceneTable.sequence = scene["sequence"]
+        return self.send(scene, self.sceneTable.walk(clip, self.subscription), "never-drop")
+    # The fields every message starts with.
+    def message(self, type):
+        message = MessageFields(type)
+        self.sequence += 1
+        message["sequence"] = self.sequence
+        return message
+    # Send a message to server in the negotiated encoding, chunk by chunk.
+    # Returns its sequence number or None if it couldn't be sent.
+    def send(self, message, events, policy):
+        if not self.pool.running or not self.online():
+            return None
+        if frame_stats.enabled:
+            started = stats_clock()
+            queued = self.pool.queuedBytes
+        self.pool.begin(policy)
+        self.writer.encoding = self.encoding
+        self.writer.begin()
+        try:
+            WriteEvents(WalkFrame(message, events, self.encoding == "binary"), self.writer)
+            self.writer.flush(True)
+        except:
+            self.pool.abort()
+            raise
+        if frame_stats.enabled:
+            # Includes waiting for room in the send queue.
+            frame_stats.span("encode", started)
+            frame_stats.bytes += self.pool.queuedBytes - queued
+        return message["sequence"]
+    # Curves request, sends the scene at startframe once and then the keyframes of
+    # every animated channel between startframe and endframe in a single message.
+    def curves(self, startframe, endframe):
+        # The curves are relative to a full scene, not a delta frame or a table.
+        self.resync = True
+        if self.frame("framedata", startframe) is None:
+            return None
+        curves = self.message("curves")
+        curves["startFrame"] = startframe
+        curves["endFrame"] = endframe
+        fps = sfmApp.GetFramesPerSecond()
+        clip = sfmApp.GetMovie().FindOrCreateFilmTrack().FindFilmClipAtTime(vs.DmeTime_t((1.0/fps)*startframe))
+        curves["channels"] = []
+        if clip is not None:
+            # Log times are local to the shot, the receiver needs its time frame to place them.
+            start, offset, scale = ClipTimeFrame(clip)
+            curves["timeFrame"] = {"start": start, "offset": offset, "scale": scale}
+            starttime = (startframe / fps - start) * scale + offset
+            endtime = (endframe / fps - start) * scale + offset
+            for animationSet, control, name, channel in FindChannels(clip):
+                parsed = ParseChannel(channel, starttime, endtime)
+                if parsed is not None:
+                    parsed["animationSet"] = animationSet
+                    parsed["control"] = control
+                    parsed["channel"] = name
+                    curves["channels"].append(parsed)
+        return self.send(curves, None, "never-drop")
 
 class SFMBridgeWindow(QtGui.QWidget):
     def __init__(self):
@@ -230,7 +1804,7 @@ class SFMBridgeWindow(QtGui.QWidget):
         self.ip = QtGui.QLineEdit(self)
         self.ip.setText("localhost:9191")
         self.ip.setPlaceholderText("localhost:9191")
-        self.ip.setToolTip("The IP address of a compatible websocket server.")
+        self.ip.setToolTip("The IP address of a compatible websocket server, separate several servers with commas.")
 
         # Buttons
         self.connectButton = QtGui.QPushButton("Connect", self)
@@ -248,6 +1822,16 @@ class SFMBridgeWindow(QtGui.QWidget):
         self.exportButton = QtGui.QPushButton("Export (!!!)", self)
         self.exportButton.clicked.connect(self.serverExport)
         self.exportButton.setToolTip("Export a movie between the start and end frames to the server.")
+        self.resumeButton = QtGui.QPushButton("Resume Export", self)
+        self.resumeButton.clicked.connect(self.serverResumeExport)
+        self.resumeButton.setToolTip("Continue an interrupted export from the first frame the server didn't acknowledge.")
+        self.exportResume = None
+        self.archiveButton = QtGui.QPushButton("Export Archive", self)
+        self.archiveButton.clicked.connect(self.exportArchive)
+        self.archiveButton.setToolTip("Export the frames between the start and end frames to a file instead of a server, it can be replayed to servers later. Doesn't need a connection.")
+        self.curvesButton = QtGui.QPushButton("Export Curves", self)
+        self.curvesButton.clicked.connect(self.serverExportCurves)
+        self.curvesButton.setToolTip("Send the scene once and the keyframes of every animated channel between the start and end frames, instead of every frame.")
 
         # Start and end frames
         self.startFrame = QtGui.QSpinBox(self)
@@ -279,14 +1863,92 @@ class SFMBridgeWindow(QtGui.QWidget):
         self.dagMultiplier.setValue(0.01)
         self.dagMultiplier.setToolTip("This value will be added to frame delay for each animation set in the current shot.")
 
+        # Export window
+        self.exportWindow = QtGui.QSpinBox(self)
+        self.exportWindow.setRange(1, 1024)
+        self.exportWindow.setValue(8)
+        self.exportWindow.setToolTip("How many exported frames can be waiting for the server to acknowledge them. Servers that don't send acks are paced by frame delay instead.")
+
         # Live update checkbox
         self.liveUpdate = QtGui.QCheckBox(self)
         self.liveUpdate.setChecked(False)
-        self.liveUpdate.setToolTip("If checked, the script will constantly transmit the current frame to the server. Experimental and should not be used on low-end machines.")
+        self.liveUpdate.setToolTip("If checked, the script will constantly transmit the current frame to the server.")
         self.liveUpdate.stateChanged.connect(self.liveUpdateChanged)
+        self.maxFps = QtGui.QSpinBox(self)
+        self.maxFps.setRange(1, 240)
+        self.maxFps.setValue(30)
+        self.maxFps.setToolTip("The most live update frames sent per second.")
+        self.maxFps.valueChanged[int].connect(self.maxFpsChanged)
+        self.idleSuppression = QtGui.QCheckBox(self)
+        self.idleSuppression.setChecked(True)
+        self.idleSuppression.setToolTip("If checked, live update only sends a frame when the playhead or the scene changed. While nothing changes the scene is checked again every frame delay.")
+        # Live update runs from the event loop, one frame per tick at most.
+        self.liveTimer = QtCore.QTimer(self)
+        self.liveTimer.timeout.connect(self.liveUpdateTick)
+        # When idle suppression next looks at the scene while the playhead stands still.
+        self.liveRescan = 0
+        # When live update next tries to send while no server is connected.
+        self.liveRetry = 0
+
+        # Delta frames checkbox
+        self.deltaFrames = QtGui.QCheckBox(self)
+        self.deltaFrames.setChecked(False)
+        self.deltaFrames.setToolTip("If checked, only attributes that changed since the last frame are transmitted. The server must support delta frames.")
+        self.deltaFrames.stateChanged.connect(self.deltaFramesChanged)
+
+        # Scene stream checkbox
+        self.sceneStream = QtGui.QCheckBox(self)
+        self.sceneStream.setChecked(False)
+        self.sceneStream.setToolTip("If checked, the scene is sent once with an id for every element and frames only carry the animated attributes that changed. The server must support scene streams.")
+        self.sceneStream.stateChanged.connect(self.sceneStreamChanged)
+
+        # Keyframe interval
+        self.keyframeInterval = QtGui.QSpinBox(self)
+        self.keyframeInterval.setRange(0, 2000000000)
+        self.keyframeInterval.setValue(30)
+        self.keyframeInterval.setToolTip("Send the full film clip every this many frames when delta frames are enabled, 0 to only send it when the server asks.")
+        self.keyframeInterval.valueChanged[int].connect(self.keyframeIntervalChanged)
+
+        # Subtree cache budget
+        self.cacheBudget = QtGui.QSpinBox(self)
+        self.cacheBudget.setRange(0, 65536)
+        self.cacheBudget.setValue(64)
+        self.cacheBudget.setSuffix(" MB")
+        self.cacheBudget.setToolTip("Memory used to reuse parts of the scene that haven't changed between frames, 0 to disable.")
+        self.cacheBudget.valueChanged[int].connect(self.cacheBudgetChanged)
+
+        # Send queue
+        self.queuePolicy = QtGui.QComboBox(self)
+        self.queuePolicy.addItems(["Block", "Drop Oldest"])
+        self.queuePolicy.setToolTip("What to do with transmitted and live update frames when the send queue is full. Drop Oldest keeps live updates current on slow servers, committed frames are never dropped.")
+        self.queuePolicy.currentIndexChanged[int].connect(self.queuePolicyChanged)
+        self.queueSize = QtGui.QSpinBox(self)
+        self.queueSize.setRange(1, 1024)
+        self.queueSize.setValue(8)
+        self.queueSize.setToolTip("How many frames can wait to be sent before the queue policy applies.")
+        self.queueSize.valueChanged[int].connect(self.queueSizeChanged)
+
+        # Instrumentation
+        self.instrumentation = QtGui.QCheckBox(self)
+        self.instrumentation.setChecked(False)
+        self.instrumentation.setToolTip("If checked, time every stage of sending a frame and count what was sent. Shown below, the timings are for the latest frames.")
+        self.instrumentation.stateChanged.connect(self.instrumentationChanged)
+        self.sendStats = QtGui.QCheckBox(self)
+        self.sendStats.setChecked(False)
+        self.sendStats.setToolTip("If checked, the timings are also sent to the server as a \"stats\" message every second while frames are being sent.")
+        self.sendStats.stateChanged.connect(self.sendStatsChanged)
+        self.saveStatsButton = QtGui.QPushButton("Save Stats", self)
+        self.saveStatsButton.clicked.connect(self.saveStats)
+        self.saveStatsButton.setToolTip("Save the timings and counters to a JSON file, e.g. after an export.")
+        self.stats = QtGui.QLabel(self)
 
         # Status "bar"
         self.status = QtGui.QLabel(self)
+        self.statusMessage = ""
+        # Keep the sender's progress up to date.
+        self.statusTimer = QtCore.QTimer(self)
+        self.statusTimer.timeout.connect(self.updateStatus)
+        self.statusTimer.start(250)
 
         # Layout
         self.layout = QtGui.QFormLayout()
@@ -296,45 +1958,79 @@ class SFMBridgeWindow(QtGui.QWidget):
         self.layout.addWidget(self.transmitButton)
         self.layout.addWidget(self.commitButton)
         self.layout.addWidget(self.exportButton)
+        self.layout.addWidget(self.resumeButton)
+        self.layout.addWidget(self.curvesButton)
+        self.layout.addWidget(self.archiveButton)
         self.layout.addRow("Start Frame:", self.startFrame)
         self.layout.addWidget(self.startFrameButton)
         self.layout.addRow("End Frame:", self.endFrame)
         self.layout.addWidget(self.endFrameButton)
         self.layout.addRow("Frame Delay:", self.frameDelay)
         self.layout.addRow("Dag Multiplier:", self.dagMultiplier)
+        self.layout.addRow("Export Window:", self.exportWindow)
         self.layout.addRow("Live Update:", self.liveUpdate)
+        self.layout.addRow("Max FPS:", self.maxFps)
+        self.layout.addRow("Idle Suppression:", self.idleSuppression)
+        self.layout.addRow("Delta Frames:", self.deltaFrames)
+        self.layout.addRow("Scene Stream:", self.sceneStream)
+        self.layout.addRow("Keyframe Interval:", self.keyframeInterval)
+        self.layout.addRow("Cache Budget:", self.cacheBudget)
+        self.layout.addRow("Queue Policy:", self.queuePolicy)
+        self.layout.addRow("Queue Size:", self.queueSize)
+        self.layout.addRow("Instrumentation:", self.instrumentation)
+        self.layout.addRow("Send Stats:", self.sendStats)
+        self.layout.addWidget(self.saveStatsButton)
+        self.layout.addRow("Stats:", self.stats)
         self.layout.addRow("Status:", self.status)
         self.setLayout(self.layout)
 
         # First boot
         if not "SFM_BRIDGE" in globals():
-            self.status.setText("Not connected.")
+            self.setStatus("Not connected.")
             self.connectButton.setEnabled(True)
             self.transmitButton.setEnabled(False)
             self.disconnectButton.setEnabled(False)
             self.commitButton.setEnabled(False)
             self.exportButton.setEnabled(False)
+            self.curvesButton.setEnabled(False)
+            self.resumeButton.setEnabled(False)
         elif "SFM_BRIDGE" in globals():
-            self.status.setText("Connected.")
+            self.setStatus("Connected.")
             self.connectButton.setEnabled(False)
             self.transmitButton.setEnabled(True)
             self.disconnectButton.setEnabled(True)
             self.commitButton.setEnabled(True)
             self.exportButton.setEnabled(True)
+            self.curvesButton.setEnabled(True)
+            self.resumeButton.setEnabled(False)
+        else:
+            self.setStatus("Unknown error.")
+
+    def setStatus(self, message):
+        self.statusMessage = message
+        self.updateStatus()
+
+    def updateStatus(self):
+        if "SFM_BRIDGE" in globals():
+            self.status.setText(self.statusMessage + " " + SFM_BRIDGE.pool.status())
         else:
-            self.status.setText("Unknown error.")
+            self.status.setText(self.statusMessage)
+        if frame_stats.enabled:
+            self.stats.setText(frame_stats.text())
 
     def serverConnect(self):
         # Check to make sure that this script has not been run before.
         if "SFM_BRIDGE" in globals():
             sfm.Msg("SFM Bridge is already running, this script can only be run once.\n")
         else:
-            self.status.setText("Connected.")
+            self.setStatus("Connected.")
             SFM_BRIDGE_TAB_WINDOW.disconnectButton.setEnabled(True)
             SFM_BRIDGE_TAB_WINDOW.transmitButton.setEnabled(True)
             SFM_BRIDGE_TAB_WINDOW.connectButton.setEnabled(False)
             SFM_BRIDGE_TAB_WINDOW.commitButton.setEnabled(True)
             SFM_BRIDGE_TAB_WINDOW.exportButton.setEnabled(True)
+            SFM_BRIDGE_TAB_WINDOW.curvesButton.setEnabled(True)
+            SFM_BRIDGE_TAB_WINDOW.resumeButton.setEnabled(self.exportResume is not None)
             # Handle connections but don't block the main thread.
             if __name__ == '__main__':
                 # Check for movie.
@@ -345,58 +2041,99 @@ class SFMBridgeWindow(QtGui.QWidget):
                     global SFM_BRIDGE
                     SFM_BRIDGE = SFM_BRIDGE_API()
             else:
-                self.status.setText("Already connected.")
+                self.setStatus("Already connected.")
                 # How did we get here?
                 sfm.Msg("SFM Bridge is running in a different thread, exiting...\n")
     
     def serverDisconnect(self):
         # Make sure SFM_BRIDGE exists.
         if "SFM_BRIDGE" in globals():
-            self.status.setText("Not connected.")
+            self.setStatus("Not connected.")
             SFM_BRIDGE_TAB_WINDOW.connectButton.setEnabled(True)
             SFM_BRIDGE_TAB_WINDOW.transmitButton.setEnabled(False)
             SFM_BRIDGE_TAB_WINDOW.disconnectButton.setEnabled(False)
             SFM_BRIDGE_TAB_WINDOW.commitButton.setEnabled(False)
             SFM_BRIDGE_TAB_WINDOW.exportButton.setEnabled(False)
+            SFM_BRIDGE_TAB_WINDOW.curvesButton.setEnabled(False)
+            SFM_BRIDGE_TAB_WINDOW.resumeButton.setEnabled(False)
             # We're good to go.
             SFM_BRIDGE.close()
         else:
-            self.status.setText("Already disconnected.")
+            self.setStatus("Already disconnected.")
             sfm.Msg("SFM Bridge is not running, this script can not be run.\n")
 
     def serverTransmit(self):
         # Make sure SFM_BRIDGE exists.
         if "SFM_BRIDGE" in globals():
             frame = sfmApp.GetHeadTimeInFrames()
-            self.status.setText("Transmitting frame " + str(frame) + ".")
+            self.setStatus("Transmitting frame " + str(frame) + ".")
             # We're good to go.
             SFM_BRIDGE.frame("framedata", frame)
         else:
-            self.status.setText("Unable to transmit.")
+            self.setStatus("Unable to transmit.")
             sfm.Msg("SFM Bridge is not running, this script can not be run.\n")
 
     def serverCommit(self):
         # Make sure SFM_BRIDGE exists.
         if "SFM_BRIDGE" in globals():
             frame = sfmApp.GetHeadTimeInFrames()
-            self.status.setText("Committing frame " + str(frame) + ".")
+            self.setStatus("Committing frame " + str(frame) + ".")
             # We're good to go.
             SFM_BRIDGE.frame("framecommit", frame)
         else:
-            self.status.setText("Unable to commit.")
+            self.setStatus("Unable to commit.")
             sfm.Msg("SFM Bridge is not running, this script can not be run.\n")
 
     def serverExport(self):
+        self.exportFrames(self.startFrame.value(), self.endFrame.value())
+
+    def serverResumeExport(self):
+        if self.exportResume is None:
+            self.setStatus("Nothing to resume.")
+        else:
+            self.exportFrames(self.exportResume, self.endFrame.value())
+
+    def exportFrames(self, start, end):
         # Make sure SFM_BRIDGE exists.
         if "SFM_BRIDGE" in globals():
             self.transmitButton.setEnabled(False)
             self.commitButton.setEnabled(False)
             self.exportButton.setEnabled(False)
-            self.status.setText("Exporting...")
+            self.curvesButton.setEnabled(False)
+            self.resumeButton.setEnabled(False)
+            self.setStatus("Exporting...")
             # We're good to go.
             SFM_BRIDGE = globals()["SFM_BRIDGE"]
-            for i in range(self.startFrame.value(), self.endFrame.value() + 1):
-                if SFM_BRIDGE is not None:
+            # Servers that acknowledge frames pace the export themselves,
+            # give the ones that haven't yet a moment to acknowledge what was already sent.
+            acks = SFM_BRIDGE.acksSupported or SFM_BRIDGE.waitForAcks(0, 1.0, True)
+            # Frames that haven't been acknowledged yet: (sequence, frame)
+            unacked = collections.deque()
+            self.exportResume = start
+            failed = False
+            # Timings and counters cover this export only.
+            frame_stats.reset()
+            for i in range(start, end + 1):
+                self.setStatus("Exporting Frame " + str(i) + ".")
+                if acks:
+                    if frame_stats.enabled:
+                        started = stats_clock()
+                    sfmApp.SetHeadTimeInFrames(i)
+                    sfmApp.ProcessEvents()
+                    if frame_stats.enabled:
+                        frame_stats.span("exportScrub", started)
+                    sequence = SFM_BRIDGE.frame("framecommit", i)
+                    if sequence is not None:
+                        unacked.append((sequence, i))
+                    if frame_stats.enabled:
+                        started = stats_clock()
+                    if sequence is None or not SFM_BRIDGE.waitForAcks(self.exportWindow.value() - 1, export_ack_timeout):
+                        failed = True
+                    if frame_stats.enabled:
+                        frame_stats.span("ackWait", started)
+                    while unacked and unacked[0][0] <= SFM_BRIDGE.acked:
+                        self.exportResume = unacked.popleft()[1] + 1
+                else:
                     curtime = vs.DmeTime_t(((1.0/sfmApp.GetFramesPerSecond())*i))
                     animSetMultiplier = 0
                     if sfmApp.GetMovie() is not None:
@@ -405,26 +2142,87 @@ class SFMBridgeWindow(QtGui.QWidget):
                             # animation set count
                             for b in range(0, clip.animationSets.count()):
                                 animSetMultiplier += self.dagMultiplier.value()
-                    self.status.setText("Exporting Frame " + str(i) + ".")
+                    if frame_stats.enabled:
+                        started = stats_clock()
                     sfmApp.SetHeadTimeInFrames(i)
                     time.sleep((self.frameDelay.value() + animSetMultiplier) / 3)
                     sfmApp.ProcessEvents()
                     time.sleep((self.frameDelay.value() + animSetMultiplier) / 3)
-                    SFM_BRIDGE.frame("framecommit", i)
+                    if frame_stats.enabled:
+                        frame_stats.span("exportScrub", started)
+                    if SFM_BRIDGE.frame("framecommit", i) is None:
+                        failed = True
+                    else:
+                        self.exportResume = i + 1
                     time.sleep((self.frameDelay.value() + animSetMultiplier) / 3)
-                else:
-                    self.transmitButton.setEnabled(True)
-                    self.commitButton.setEnabled(True)
-                    self.exportButton.setEnabled(True)
-                    self.status.setText("Export failed.")
-                    sfm.Msg("SFM Bridge could not send a frame commit, stopping.\n")
+                if failed or "SFM_BRIDGE" not in globals():
+                    failed = True
                     break # if you disconnect, stop trying to send frames.
-            self.transmitButton.setEnabled(True)
-            self.commitButton.setEnabled(True)
-            self.exportButton.setEnabled(True)
-            self.status.setText("Export complete.")
+            # Wait for the server to catch up with the last frames.
+            if acks and not failed:
+                failed = not SFM_BRIDGE.waitForAcks(0, export_ack_timeout)
+                while unacked and unacked[0][0] <= SFM_BRIDGE.acked:
+                    self.exportResume = unacked.popleft()[1] + 1
+            if frame_stats.enabled and os.environ.get("SFM_BRIDGE_STATS_FILE"):
+                frame_stats.dump(os.environ.get("SFM_BRIDGE_STATS_FILE"))
+            connected = "SFM_BRIDGE" in globals()
+            self.transmitButton.setEnabled(connected)
+            self.commitButton.setEnabled(connected)
+            self.exportButton.setEnabled(connected)
+            self.curvesButton.setEnabled(connected)
+            if failed:
+                self.resumeButton.setEnabled(connected)
+                self.setStatus("Export interrupted, it can be resumed from frame " + str(self.exportResume) + ".")
+                sfm.Msg("SFM Bridge could not send a frame commit, stopping.\n")
+            else:
+                self.exportResume = None
+                self.setStatus("Export complete.")
+        else:
+            self.setStatus("Unable to export.")
+            sfm.Msg("SFM Bridge is not running, this script can not be run.\n")
+
+    def exportArchive(self):
+        if sfmApp.GetMovie() is None:
+            self.setStatus("Unable to export, no session is open.")
+            return
+        path = QtGui.QFileDialog.getSaveFileName(self, "Export Archive", "export.sfmarchive", "SFM Bridge archives (*.sfmarchive)")
+        # PySide returns the path and the selected filter.
+        if isinstance(path, tuple):
+            path = path[0]
+        if not path:
+            return
+        # Use the connection's encoding when there is one.
+        if "SFM_BRIDGE" in globals():
+            encoding = SFM_BRIDGE.encoding
         else:
-            self.status.setText("Unable to export.")
+            encoding = os.environ.get("SFM_BRIDGE_ENCODING") or "json"
+            if encoding not in supported_encodings:
+                encoding = "json"
+        self.archiveButton.setEnabled(False)
+        self.setStatus("Exporting archive...")
+        archive = FrameArchive(path, self.startFrame.value(), self.endFrame.value(), encoding)
+        try:
+            for i in range(self.startFrame.value(), self.endFrame.value() + 1):
+                self.setStatus("Exporting Frame " + str(i) + " to archive.")
+                sfmApp.SetHeadTimeInFrames(i)
+                sfmApp.ProcessEvents()
+                archive.frame(i)
+        finally:
+            archive.close()
+            self.archiveButton.setEnabled(True)
+        self.setStatus("Archive export complete.")
+
+    def serverExportCurves(self):
+        # Make sure SFM_BRIDGE exists.
+        if "SFM_BRIDGE" in globals():
+            self.setStatus("Exporting curves...")
+            # We're good to go.
+            if SFM_BRIDGE.curves(self.startFrame.value(), self.endFrame.value()) is None:
+                self.setStatus("Curve export failed.")
+            else:
+                self.setStatus("Curve export complete.")
+        else:
+            self.setStatus("Unable to export.")
             sfm.Msg("SFM Bridge is not running, this script can not be run.\n")
 
     def startFrameChanged(self, value):
@@ -434,25 +2232,97 @@ class SFMBridgeWindow(QtGui.QWidget):
         self.endFrame.setValue(value)
 
     def liveUpdateChanged(self, value):
-        # Make sure SFM_BRIDGE exists.
         if value:
-            self.status.setText("Live update enabled.")
-            while self.liveUpdate.isChecked():
-                if "SFM_BRIDGE" in globals():
-                    startframe = sfmApp.GetHeadTimeInFrames()
-                    SFM_BRIDGE.frame("framedata", startframe)
-                    sfmApp.ProcessEvents()
-                    curtime = vs.DmeTime_t(((1.0/sfmApp.GetFramesPerSecond())*startframe))
-                    animSetMultiplier = 0
-                    if sfmApp.GetMovie() is not None:
-                        if sfmApp.GetMovie().FindOrCreateFilmTrack().FindFilmClipAtTime(curtime) is not None:
-                            clip = sfmApp.GetMovie().FindOrCreateFilmTrack().FindFilmClipAtTime(curtime)
-                            # animation set count
-                            for i in range(0, clip.animationSets.count()):
-                                animSetMultiplier += self.dagMultiplier.value()
-                    time.sleep(self.frameDelay.value() + animSetMultiplier)
+            self.setStatus("Live update enabled.")
+            self.liveRescan = 0
+            self.liveRetry = 0
+            self.liveTimer.start(int(1000 / self.maxFps.value()))
+        else:
+            self.liveTimer.stop()
+            self.setStatus("Live update disabled.")
+
+    def maxFpsChanged(self, value):
+        self.liveTimer.setInterval(int(1000 / value))
+
+    def liveUpdateTick(self):
+        # Make sure SFM_BRIDGE exists, exports move the playhead themselves.
+        if not "SFM_BRIDGE" in globals() or not self.exportButton.isEnabled() or not self.archiveButton.isEnabled():
+            return
+        # Nothing can be sent while no server is connected, check again later.
+        now = time.time()
+        if now < self.liveRetry:
+            return
+        startframe = sfmApp.GetHeadTimeInFrames()
+        if not self.idleSuppression.isChecked():
+            if SFM_BRIDGE.frame("framedata", startframe) is None:
+                self.liveRetry = now + live_retry_delay
+            return
+        # Moving the playhead is cheap to notice and always sent, edits to the
+        # scene are only noticed by parsing it again, which waits for the frame delay while idle.
+        if startframe == SFM_BRIDGE.lastFrame and now < self.liveRescan:
+            return
+        sequence = SFM_BRIDGE.frame("framedata", startframe, True)
+        if sequence is None:
+            self.liveRetry = now + live_retry_delay
+        elif sequence is False:
+            curtime = vs.DmeTime_t(((1.0/sfmApp.GetFramesPerSecond())*startframe))
+            animSetMultiplier = 0
+            if sfmApp.GetMovie() is not None:
+                if sfmApp.GetMovie().FindOrCreateFilmTrack().FindFilmClipAtTime(curtime) is not None:
+                    clip = sfmApp.GetMovie().FindOrCreateFilmTrack().FindFilmClipAtTime(curtime)
+                    # animation set count
+                    for i in range(0, clip.animationSets.count()):
+                        animSetMultiplier += self.dagMultiplier.value()
+            self.liveRescan = now + self.frameDelay.value() + animSetMultiplier
         else:
-            self.status.setText("Live update disabled.")
+            # Something is being edited, keep looking every tick.
+            self.liveRescan = now
+
+    def deltaFramesChanged(self, value):
+        if "SFM_BRIDGE" in globals():
+            SFM_BRIDGE.deltaFrames = bool(value)
+            SFM_BRIDGE.resync = True
+
+    def instrumentationChanged(self, value):
+        frame_stats.reset()
+        frame_stats.enabled = bool(value)
+        if not value:
+            self.stats.setText("")
+
+    def sendStatsChanged(self, value):
+        if "SFM_BRIDGE" in globals():
+            SFM_BRIDGE.sendStats = bool(value)
+
+    def saveStats(self):
+        path = QtGui.QFileDialog.getSaveFileName(self, "Save Stats", "sfm_bridge_stats.json", "JSON (*.json)")
+        # PySide returns the path and the selected filter.
+        if isinstance(path, tuple):
+            path = path[0]
+        if path:
+            frame_stats.dump(path)
+            self.setStatus("Stats saved.")
+
+    def sceneStreamChanged(self, value):
+        if "SFM_BRIDGE" in globals():
+            SFM_BRIDGE.sceneStream = bool(value)
+            SFM_BRIDGE.sceneTable = None
+
+    def keyframeIntervalChanged(self, value):
+        if "SFM_BRIDGE" in globals():
+            SFM_BRIDGE.keyframeInterval = value
+
+    def cacheBudgetChanged(self, value):
+        if "SFM_BRIDGE" in globals():
+            subtree_cache.budget = value * 1024 * 1024
+            subtree_cache.evict()
+
+    def queuePolicyChanged(self, value):
+        if "SFM_BRIDGE" in globals():
+            SFM_BRIDGE.queuePolicy = queue_policies[value]
+
+    def queueSizeChanged(self, value):
+        if "SFM_BRIDGE" in globals():
+            SFM_BRIDGE.pool.setMaxFrames(value)
 
     def setStartFrame(self):
         self.startFrame.setValue(sfmApp.GetHeadTimeInFrames())
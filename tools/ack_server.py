@@ -0,0 +1,95 @@
+# SFM Bridge: ack_server.py
+# This software is licensed under the MIT License.
+# Copyright (c) 2021 KiwifruitDev
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Stand-in SFM Bridge server for testing exports without a real receiver.
+# It decodes every frame, acknowledges it and prints a line about it.
+#
+# Usage: python ack_server.py [--port 9191] [--delay 0.1] [--encoding binary] [--compression zlib] [--stop-after 10]
+# --delay simulates a slow receiver by waiting before every ack.
+# --stop-after drops the connection after that many frames, to test resuming exports.
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from sfm_bridge_binary import FrameReader
+
+# Send a message back to the client.
+def SendMessage(connection, message):
+    connection.sendall(b"!START!" + json.dumps(message).encode() + b"!END!")
+
+# Receive, acknowledge and report frames until the client disconnects.
+# Returns how many frames were received.
+def Serve(connection, delay, encoding, compression, dictionary, stopafter, quiet):
+    reader = FrameReader()
+    received = 0
+    receivedBytes = 0
+    start = time.time()
+    if encoding is not None:
+        SendMessage(connection, {"type": "encoding", "encoding": encoding})
+    if compression is not None:
+        SendMessage(connection, {"type": "compression", "compression": compression, "dictionary": dictionary})
+    while True:
+        data = connection.recv(65536)
+        if not data:
+            break
+        receivedBytes += len(data)
+        for frame in reader.feed(data):
+            received += 1
+            if not quiet:
+                print(str(frame.get("type")) + " " + str(frame.get("sequence")) + ": frame " + str(frame.get("currentFrame")) + (", keyframe" if frame.get("keyframe") else ", delta"))
+            if delay > 0:
+                time.sleep(delay)
+            if stopafter is not None and received >= stopafter:
+                return received
+            if frame.get("sequence") is not None:
+                SendMessage(connection, {"type": "ack", "sequence": frame["sequence"]})
+    if not quiet:
+        print(str(received) + " frames (" + str(receivedBytes // 1024) + " KB) in " + str(round(time.time() - start, 2)) + " seconds.")
+    return received
+
+def Main():
+    parser = argparse.ArgumentParser(description="Stand-in SFM Bridge server that acknowledges every frame.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=9191)
+    parser.add_argument("--delay", type=float, default=0, help="seconds to wait before acknowledging each frame")
+    parser.add_argument("--encoding", choices=["json", "binary"], help="ask the client to switch to this encoding")
+    parser.add_argument("--compression", choices=["none", "zlib"], help="ask the client to switch to this compression")
+    parser.add_argument("--dictionary", action="store_true", help="ask for the compressed stream to be primed with the last uncompressed frame")
+    parser.add_argument("--stop-after", type=int, help="drop the connection after this many frames")
+    parser.add_argument("--once", action="store_true", help="exit after the first client disconnects")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((args.host, args.port))
+    server.listen(1)
+    print("Listening on " + args.host + ":" + str(args.port) + ".")
+    while True:
+        connection, address = server.accept()
+        print("Client connected from " + address[0] + ".")
+        try:
+            Serve(connection, args.delay, args.encoding, args.compression, args.dictionary, args.stop_after, args.quiet)
+        except socket.error as error:
+            print("Connection error: " + str(error))
+        connection.close()
+        print("Client disconnected.")
+        if args.once:
+            break
+    server.close()
+
+if __name__ == "__main__":
+    Main()
@@ -0,0 +1,210 @@
+# SFM Bridge: benchmark.py
+# This software is licensed under the MIT License.
+# Copyright (c) 2021 KiwifruitDev
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Benchmarks Open_Menu.py outside of SFM on a synthetic scene (see sfm_fake.py).
+# Prints one JSON object with the settings and the results, so runs can be compared.
+#
+# Usage: python benchmark.py [--animation-sets 4] [--bones 60] [--flex-controllers 40]
+#                            [--array-size 64] [--frames 120] [--encoding binary]
+#                            [--delta] [--compression zlib] [--cache-mb 64] [--stats]
+#                            [--output results.json]
+#
+# traversal: ParseElement on the film clip, per frame.
+# encode: encoding the parsed frame message, per frame, and its size.
+# endToEnd: SFM_BRIDGE_API.frame() for every frame, until the last byte reaches a local sink server.
+
+import argparse
+import json
+import os
+import platform
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import sfm_fake
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Accepts one connection and reads everything sent to it.
+class LoopbackSink(object):
+    def __init__(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.received = 0
+        self.thread = threading.Thread(target=self.run, name="Benchmark Sink")
+        self.thread.daemon = True
+        self.thread.start()
+    def run(self):
+        connection = self.server.accept()[0]
+        while True:
+            data = connection.recv(1 << 20)
+            if not data:
+                break
+            self.received += len(data)
+        connection.close()
+        self.server.close()
+
+# Milliseconds per frame: mean, median, 95th percentile and max.
+def Summary(samples):
+    samples = sorted(samples)
+    if not samples:
+        return None
+    return {
+        "meanMs": round(sum(samples) / len(samples) * 1000, 4),
+        "p50Ms": round(samples[len(samples) // 2] * 1000, 4),
+        "p95Ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 4),
+        "maxMs": round(samples[-1] * 1000, 4),
+    }
+
+# Elements and attributes the full scene has, whether or not they are sent.
+def CountScene(clip):
+    seen = set()
+    stack = [clip]
+    attributes = 0
+    while stack:
+        element = stack.pop()
+        if element.GetId() in seen:
+            continue
+        seen.add(element.GetId())
+        for name, typestring, value in element.attributes:
+            attributes += 1
+            if typestring == "element" and value is not None:
+                stack.append(value)
+            elif typestring == "element_array":
+                stack.extend([item for item in value if item is not None])
+    return {"elements": len(seen), "attributes": attributes}
+
+def Traverse(bridge, args, message):
+    traversal = []
+    encode = []
+    sizes = []
+    if tracemalloc is not None:
+        tracemalloc.start()
+    for frame in range(args.frames):
+        sfm_fake.SetHeadTimeInFrames(frame)
+        start = time.time()
+        # The cache is only used where SFM_BRIDGE_API uses it, see cacheActive.
+        filmClip = bridge.ParseElement(sfm_fake.GetClip(), None, None, args.delta or args.encoding == "binary")
+        traversal.append(time.time() - start)
+        message["currentFrame"] = frame
+        message["filmClip"] = filmClip
+        start = time.time()
+        data = bridge.EncodeFrame(message, args.encoding)
+        encode.append(time.time() - start)
+        sizes.append(len(data))
+    peak = None
+    if tracemalloc is not None:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        "traversal": Summary(traversal),
+        "encode": Summary(encode),
+        "bytesPerFrame": sum(sizes) // len(sizes),
+        "peakMemoryBytes": peak,
+    }
+
+def EndToEnd(bridge, args):
+    sink = LoopbackSink()
+    os.environ["SFM_BRIDGE_TCP_IP"] = "127.0.0.1"
+    os.environ["SFM_BRIDGE_TCP_PORT"] = str(sink.port)
+    sfm_fake.SetHeadTimeInFrames(0)
+    api = bridge.SFM_BRIDGE_API()
+    # The frame sent on connect isn't counted.
+    sender = api.pool.senders[0]
+    Drain(api, sink, 1)
+    sentBytes = sender.sentBytes
+    bridge.frame_stats.reset()
+    start = time.time()
+    for frame in range(1, args.frames + 1):
+        api.frame("framedata", frame)
+    Drain(api, sink, args.frames + 1)
+    seconds = time.time() - start
+    frames = sender.sentFrames - 1
+    result = {
+        "frames": frames,
+        "seconds": round(seconds, 4),
+        "fps": round(frames / seconds, 2) if seconds > 0 else None,
+        "bytesPerFrame": (sender.sentBytes - sentBytes) // max(frames, 1),
+        "droppedFrames": sender.droppedFrames,
+    }
+    api.close()
+    sink.thread.join(5)
+    return result
+
+# Wait until this many frames have been sent (or dropped) and everything sent has been received.
+def Drain(api, sink, frames):
+    sender = api.pool.senders[0]
+    while sender.sentFrames + sender.droppedFrames < frames or sink.received < sender.sentBytes:
+        if not sender.connected:
+            raise sender.error
+        time.sleep(0.001)
+
+def Main():
+    parser = argparse.ArgumentParser(description="Benchmark SFM Bridge on a synthetic scene.")
+    parser.add_argument("--animation-sets", type=int, default=4)
+    parser.add_argument("--bones", type=int, default=60, help="bones per model")
+    parser.add_argument("--flex-controllers", type=int, default=40, help="flex controllers per model")
+    parser.add_argument("--array-size", type=int, default=64, help="keyframes per channel and items per model array")
+    parser.add_argument("--moving", type=int, default=4, help="every this many bones move between frames")
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--encoding", choices=["json", "binary"], default="json")
+    parser.add_argument("--delta", action="store_true", help="send delta frames")
+    parser.add_argument("--compression", choices=["none", "zlib"], default="none", help="compress the end to end run")
+    parser.add_argument("--cache-mb", type=int, default=64, help="subtree cache budget, 0 to disable")
+    parser.add_argument("--stats", action="store_true", help="enable instrumentation and include its summary of the end to end run")
+    parser.add_argument("--output", help="write the results to this file instead of stdout")
+    args = parser.parse_args()
+    os.environ["SFM_BRIDGE_ENCODING"] = args.encoding
+    os.environ["SFM_BRIDGE_DELTA"] = "1" if args.delta else "0"
+    os.environ["SFM_BRIDGE_COMPRESSION"] = args.compression
+    os.environ["SFM_BRIDGE_CACHE_MB"] = str(args.cache_mb)
+    os.environ["SFM_BRIDGE_STATS"] = "1" if args.stats else "0"
+    bridge = sfm_fake.LoadBridge()
+    built = sfm_fake.BuildScene(args.animation_sets, args.bones, args.flex_controllers, args.array_size)
+    sfm_fake.SetScene(built, args.moving)
+    bridge.subtree_cache.budget = args.cache_mb * 1024 * 1024
+    results = {
+        "python": platform.python_version(),
+        "version": bridge.SFM_BRIDGE_VERSION,
+        "settings": vars(args),
+        "scene": CountScene(sfm_fake.GetClip()),
+    }
+    bridge.subtree_cache.clear()
+    results.update(Traverse(bridge, args, {"type": "framedata", "encodings": bridge.supported_encodings}))
+    bridge.subtree_cache.clear()
+    results["endToEnd"] = EndToEnd(bridge, args)
+    if args.stats:
+        results["stats"] = bridge.frame_stats.summary()
+    if resource is not None:
+        # Kilobytes on Linux, bytes on macOS.
+        results["maxRss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    Main()
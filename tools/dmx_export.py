@@ -0,0 +1,135 @@
+# SFM Bridge: dmx_export.py
+# This software is licensed under the MIT License.
+# Copyright (c) 2021 KiwifruitDev
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Exports the shots of a session .dmx to frame archives without SFM, with the same
+# frames Export Archive writes (see sfm_dmx.py for what is evaluated).
+# Shots are split into parts of --frames-per-job frames that a pool of processes exports
+# in parallel, the parts of each shot are then joined into one archive.
+#
+# Usage: python dmx_export.py session.dmx [--output exports] [--shot shot1] [--start 0] [--end 100]
+#                             [--encoding binary] [--jobs 8] [--frames-per-job 240] [--fps 24] [--list]
+# Archives are named after their shots, tools/replay.py streams them to a server.
+
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import sfm_dmx
+import sfm_fake
+from sfm_bridge_archive import ArchiveReader
+
+# The bridge and session of this process, loaded once per process.
+loaded = {}
+
+def LoadSession(path, fps):
+    if loaded.get("path") != (path, fps):
+        bridge = sfm_fake.LoadBridge()
+        session = sfm_dmx.Session(sfm_dmx.ReadDMX(path), fps)
+        session.Install()
+        loaded.update(path=(path, fps), bridge=bridge, session=session)
+    return loaded["bridge"], loaded["session"]
+
+# Pool task: write frames start to end of a shot to its own archive.
+# Returns the part's path and how many frames were written.
+def ExportPart(task):
+    path, fps, partpath, first, start, end, encoding = task
+    bridge, session = LoadSession(path, fps)
+    archive = bridge.FrameArchive(partpath, start, end, encoding)
+    # Sequence numbers carry on from the frames before this part, as if the shot was
+    # exported at once: the scene is 1 and the shot's first frame 2.
+    archive.sequence = start - first + 1
+    for frame in range(start, end + 1):
+        session.SetHeadTimeInFrames(frame)
+        archive.frame(frame)
+    archive.close()
+    return partpath, end - start + 1
+
+# Write an archive for frames first to last, made of the frames of its parts.
+def JoinParts(bridge, path, first, last, encoding, parts):
+    archive = bridge.FrameArchive(path, first, last, encoding)
+    for partpath in parts:
+        part = ArchiveReader(partpath)
+        for frame in part.frames():
+            data = bytes(part.frame(frame))
+            offset = archive.file.tell()
+            archive.file.write(data)
+            archive.entries[frame - first] = (frame, bridge.ARCHIVE_FRAME_PRESENT, offset, len(data))
+        part.close()
+        os.remove(partpath)
+    archive.close()
+
+def Main():
+    parser = argparse.ArgumentParser(description="Export the shots of an SFM session to SFM Bridge frame archives without SFM.")
+    parser.add_argument("session", help="session .dmx file (keyvalues2 or binary)")
+    parser.add_argument("--output", default=".", help="directory for the archives")
+    parser.add_argument("--shot", action="append", help="name or index of a shot to export, can be repeated (default: every shot)")
+    parser.add_argument("--start", type=int, help="first movie frame to export")
+    parser.add_argument("--end", type=int, help="last movie frame to export")
+    parser.add_argument("--encoding", choices=["json", "binary"], default="json")
+    parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count(), help="processes to export with (default: one per core)")
+    parser.add_argument("--frames-per-job", type=int, default=240, help="frames each process exports at a time")
+    parser.add_argument("--fps", type=float, help="frame rate (default: the session's)")
+    parser.add_argument("--list", action="store_true", help="list the shots and exit")
+    args = parser.parse_args()
+    began = time.time()
+    bridge, session = LoadSession(os.path.abspath(args.session), args.fps)
+    shots = []
+    for index, shot in enumerate(session.shots):
+        name = shot[2].GetName() or "shot" + str(index)
+        first, last = session.Frames(shot)
+        if args.list:
+            print(str(index) + ": " + name + ", frames " + str(first) + " to " + str(last) + ".")
+        elif not args.shot or name in args.shot or str(index) in args.shot:
+            first = max(first, args.start) if args.start is not None else first
+            last = min(last, args.end) if args.end is not None else last
+            if first <= last:
+                filename = re.sub(r"[^\w.-]", "_", name)
+                if any(filename == other[1] for other in shots):
+                    filename += "_" + str(index)
+                shots.append((name, filename, first, last, []))
+    if args.list:
+        return
+    if not shots:
+        sys.stderr.write("No shots to export.\n")
+        sys.exit(1)
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+    tasks = []
+    for name, filename, first, last, parts in shots:
+        for start in range(first, last + 1, max(args.frames_per_job, 1)):
+            end = min(start + max(args.frames_per_job, 1) - 1, last)
+            partpath = os.path.join(args.output, filename + "." + str(start) + ".part")
+            parts.append(partpath)
+            tasks.append((os.path.abspath(args.session), args.fps, partpath, first, start, end, args.encoding))
+    # Processes forked from here already have the session loaded.
+    if args.jobs > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(min(args.jobs, len(tasks)))
+        try:
+            results = pool.map(ExportPart, tasks, 1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [ExportPart(task) for task in tasks]
+    frames = sum([result[1] for result in results])
+    for name, filename, first, last, parts in shots:
+        path = os.path.join(args.output, filename + ".sfmarchive")
+        JoinParts(bridge, path, first, last, args.encoding, parts)
+        print("Exported " + name + " (frames " + str(first) + " to " + str(last) + ") to " + path + ".")
+    print("Exported " + str(frames) + " frames in " + str(round(time.time() - began, 2)) + " seconds.")
+
+if __name__ == "__main__":
+    Main()
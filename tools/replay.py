@@ -0,0 +1,82 @@
+# SFM Bridge: replay.py
+# This software is licensed under the MIT License.
+# Copyright (c) 2021 KiwifruitDev
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Streams a frame archive to an SFM Bridge server, the way SFM would have sent it.
+# Frames go straight from the memory-mapped archive to the socket.
+#
+# Usage: python replay.py export.sfmarchive [--host localhost] [--port 9191] [--fps 24] [--start 0] [--end 100] [--loop]
+# --fps defaults to the archive's frame rate, 0 sends frames as fast as the server takes them.
+
+import argparse
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from sfm_bridge_archive import ArchiveReader
+
+# Send the archive's scene and then its frames from start to end at fps frames per second.
+# Returns how many frames were sent.
+def Replay(archive, connection, start, end, fps, loop):
+    connection.sendall(archive.scene())
+    frames = [frame for frame in archive.frames() if start <= frame <= end]
+    sent = 0
+    while frames:
+        due = time.time()
+        for frame in frames:
+            if fps > 0:
+                delay = due - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                due += 1.0 / fps
+            connection.sendall(archive.frame(frame))
+            sent += 1
+        if not loop:
+            break
+    return sent
+
+def Main():
+    parser = argparse.ArgumentParser(description="Stream an SFM Bridge frame archive to a server.")
+    parser.add_argument("archive")
+    parser.add_argument("--host", default=os.environ.get("SFM_BRIDGE_TCP_IP") or "localhost")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("SFM_BRIDGE_TCP_PORT") or 9191))
+    parser.add_argument("--fps", type=float, help="frames per second, 0 for as fast as possible (default: the archive's frame rate)")
+    parser.add_argument("--start", type=int, help="first frame to send")
+    parser.add_argument("--end", type=int, help="last frame to send")
+    parser.add_argument("--loop", action="store_true", help="start over after the last frame until interrupted")
+    args = parser.parse_args()
+    archive = ArchiveReader(args.archive)
+    start = args.start if args.start is not None else archive.startFrame
+    end = args.end if args.end is not None else archive.endFrame
+    fps = args.fps if args.fps is not None else archive.frameRate
+    connection = socket.create_connection((args.host, args.port))
+    began = time.time()
+    try:
+        sent = Replay(archive, connection, start, end, fps, args.loop)
+    except KeyboardInterrupt:
+        sent = None
+    # Let the server read everything and close its end first, ignoring its acks.
+    connection.shutdown(socket.SHUT_WR)
+    connection.settimeout(5)
+    try:
+        while connection.recv(65536):
+            pass
+    except socket.error:
+        pass
+    connection.close()
+    if sent is not None:
+        print("Sent " + str(sent) + " frames in " + str(round(time.time() - began, 2)) + " seconds.")
+    archive.close()
+
+if __name__ == "__main__":
+    Main()
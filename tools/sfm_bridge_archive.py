@@ -0,0 +1,117 @@
+# SFM Bridge: sfm_bridge_archive.py
+# This software is licensed under the MIT License.
+# Copyright (c) 2021 KiwifruitDev
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Reader for the frame archives written by Export Archive in Open_Menu.py.
+# The file is memory-mapped, any frame is found with one index lookup and
+# returned without copying it. On Python 3 frames are views into the map, so
+# they should be released (or copied with bytes()) before the reader is closed,
+# "with ArchiveReader(path) as archive:" scopes them to a block.
+#
+# Usage: python sfm_bridge_archive.py export.sfmarchive [frame]
+# Prints the archive's scene message and how many frames it holds, or one frame as JSON.
+
+import json
+import mmap
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from sfm_bridge_binary import FrameReader
+
+# Keep these in sync with mainmenu/SFM Bridge/Open_Menu.py.
+ARCHIVE_MAGIC = b"SFMBARCH"
+ARCHIVE_VERSION = 1
+ARCHIVE_HEADER = struct.Struct("<8sHBBdiIQQQ")
+ARCHIVE_INDEX_ENTRY = struct.Struct("<iIQQ")
+ARCHIVE_FRAME_PRESENT = 1
+archive_encodings = ["json", "binary"]
+
+# Decode every message in data, which holds whole messages as they were sent.
+def DecodeMessages(data):
+    reader = FrameReader()
+    messages = reader.feed(bytes(data))
+    if reader.buffer or reader.chunks:
+        raise ValueError("Archive data ends with an incomplete message.")
+    return messages
+
+class ArchiveReader(object):
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        # Python 2 can't take a memoryview of a mmap, slices are copied there.
+        try:
+            self.view = memoryview(self.map)
+        except TypeError:
+            self.view = self.map
+        magic, version, encoding, flags, self.frameRate, self.startFrame, self.count, self.sceneOffset, self.sceneLength, self.indexOffset = ARCHIVE_HEADER.unpack_from(self.map, 0)
+        if magic != ARCHIVE_MAGIC:
+            raise ValueError("Not an SFM Bridge archive.")
+        if version != ARCHIVE_VERSION:
+            raise ValueError("Unsupported archive version " + str(version) + ".")
+        self.encoding = archive_encodings[encoding]
+        self.endFrame = self.startFrame + self.count - 1
+    def __len__(self):
+        return self.count
+    # The scene block as it was sent, the "archive" message.
+    def scene(self):
+        return self.view[self.sceneOffset:self.sceneOffset + self.sceneLength]
+    # Index entry of a frame: (frame, flags, offset, length), or None outside the archive.
+    def entry(self, frame):
+        position = frame - self.startFrame
+        if position < 0 or position >= self.count:
+            return None
+        return ARCHIVE_INDEX_ENTRY.unpack_from(self.map, self.indexOffset + position * ARCHIVE_INDEX_ENTRY.size)
+    # A frame as it was sent, or None if it isn't in the archive.
+    def frame(self, frame):
+        entry = self.entry(frame)
+        if entry is None or not entry[1] & ARCHIVE_FRAME_PRESENT:
+            return None
+        return self.view[entry[2]:entry[2] + entry[3]]
+    # A frame decoded into a dict.
+    def decode(self, frame):
+        data = self.frame(frame)
+        if data is None:
+            return None
+        return DecodeMessages(data)[0]
+    # Frame numbers that were written.
+    def frames(self):
+        return [frame for frame in range(self.startFrame, self.endFrame + 1) if self.entry(frame)[1] & ARCHIVE_FRAME_PRESENT]
+    def close(self):
+        try:
+            if self.view is not self.map:
+                self.view.release()
+            self.map.close()
+        except BufferError:
+            # Frames handed out are still in use, the map is closed once they are gone.
+            pass
+        self.file.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        sys.stderr.write("Usage: python sfm_bridge_archive.py export.sfmarchive [frame]\n")
+        sys.exit(1)
+    archive = ArchiveReader(sys.argv[1])
+    if len(sys.argv) == 3:
+        frame = archive.decode(int(sys.argv[2]))
+        if frame is None:
+            sys.stderr.write("Frame " + sys.argv[2] + " is not in the archive.\n")
+            sys.exit(1)
+        print(json.dumps(frame, default=lambda value: value.items()))
+    else:
+        print(json.dumps(DecodeMessages(archive.scene())[0], default=lambda value: value.items()))
+        print(str(len(archive.frames())) + " of " + str(len(archive)) + " frames (" + str(archive.startFrame) + " to " + str(archive.endFrame) + "), " + archive.encoding + ".")
+    archive.close()
@@ -0,0 +1,287 @@
+# SFM Bridge: sfm_bridge_binary.py
+# This software is licensed under the MIT License.
+# Copyright (c) 2021 KiwifruitDev
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Reference decoder for the frames sent by Open_Menu.py.
+# This runs outside of SFM, on Python 2.7 or 3, and has no dependencies.
+# Compressed streams primed with a dictionary need Python 3.3 or newer.
+#
+# Usage: python sfm_bridge_binary.py capture.bin
+# Prints every frame found in a captured stream as a line of JSON.
+
+import array
+import base64
+import json
+import struct
+import sys
+import zlib
+
+# Keep these in sync with mainmenu/SFM Bridge/Open_Menu.py.
+BINARY_MAGIC = b"SFMB"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sBBI")
+FLAG_MORE = 1
+COMPRESSED_MAGIC = b"SFMZ"
+FLAG_RESET = 2
+FLAG_DICTIONARY = 4
+COMPRESSION_DICTIONARY_SIZE = 32768
+TAG_NONE = 0
+TAG_FALSE = 1
+TAG_TRUE = 2
+TAG_INT = 3
+TAG_FLOAT = 4
+TAG_STRING = 5
+TAG_LIST = 6
+TAG_DICT = 7
+TAG_ARRAY = 8
+TAG_DICT_STREAM = 9
+TAG_LIST_STREAM = 10
+TAG_END = 11
+TAG_COLOR = 16
+TAG_VECTOR2 = 17
+TAG_VECTOR3 = 18
+TAG_VECTOR4 = 19
+TAG_QANGLE = 20
+TAG_QUATERNION = 21
+# Kind, struct and field names for each typed value tag.
+binary_types = {
+    TAG_COLOR: ("color", struct.Struct("<4B"), ("r", "g", "b", "a")),
+    TAG_VECTOR2: ("vector2", struct.Struct("<2f"), ("x", "y")),
+    TAG_VECTOR3: ("vector3", struct.Struct("<3f"), ("x", "y", "z")),
+    TAG_VECTOR4: ("vector4", struct.Struct("<4f"), ("x", "y", "z", "w")),
+    TAG_QANGLE: ("qangle", struct.Struct("<3f"), ("x", "y", "z")),
+    TAG_QUATERNION: ("quaternion", struct.Struct("<4f"), ("x", "y", "z", "w")),
+}
+
+# Packed array kinds in the order they are numbered, with their typecode and stride.
+packed_kinds = [
+    ("float", "f", 1),
+    ("int", "i", 1),
+    ("bool", "B", 1),
+    ("color", "B", 4),
+    ("vector2", "f", 2),
+    ("vector3", "f", 3),
+    ("vector4", "f", 4),
+    ("qangle", "f", 3),
+    ("quaternion", "f", 4),
+]
+packed_formats = {"float32": "f", "int32": "i", "uint8": "B"}
+
+# A decoded value that remembers which datamodel type it came from.
+# It compares equal to the object the JSON encoding would have produced.
+class TypedValue(dict):
+    __slots__ = ("kind",)
+    def __init__(self, kind, fields):
+        dict.__init__(self, fields)
+        self.kind = kind
+
+# A decoded numeric or vector array, data is a flat array.array with stride numbers per item.
+class PackedArray(object):
+    __slots__ = ("kind", "stride", "data")
+    def __init__(self, kind, stride, data):
+        self.kind = kind
+        self.stride = stride
+        self.data = data
+    def __len__(self):
+        return len(self.data) // self.stride
+    def __eq__(self, other):
+        return isinstance(other, PackedArray) and self.kind == other.kind and self.data == other.data
+    def __ne__(self, other):
+        return not self == other
+    # The items as tuples, or plain numbers when the stride is 1.
+    def items(self):
+        if self.stride == 1:
+            return list(self.data)
+        return [tuple(self.data[i:i + self.stride]) for i in range(0, len(self.data), self.stride)]
+
+# Build an array.array from little-endian bytes.
+def UnpackArray(typecode, data):
+    values = array.array(typecode)
+    if hasattr(values, "frombytes"):
+        values.frombytes(data)
+    else:
+        values.fromstring(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+# Used as json.loads' object_hook so packed arrays in JSON frames decode like binary ones.
+def DecodeJSONObject(value):
+    if "packed" in value and "data" in value:
+        data = UnpackArray(packed_formats[value["format"]], base64.b64decode(value["data"]))
+        return PackedArray(value["packed"], value["stride"], data)
+    return value
+
+# Decode one tagged value from data at offset, returns the value and the offset after it.
+def DecodeValue(data, offset):
+    tag = struct.unpack_from("<B", data, offset)[0]
+    offset += 1
+    if tag == TAG_NONE:
+        return None, offset
+    elif tag == TAG_FALSE:
+        return False, offset
+    elif tag == TAG_TRUE:
+        return True, offset
+    elif tag == TAG_INT:
+        return struct.unpack_from("<q", data, offset)[0], offset + 8
+    elif tag == TAG_FLOAT:
+        return struct.unpack_from("<d", data, offset)[0], offset + 8
+    elif tag == TAG_STRING:
+        length = struct.unpack_from("<I", data, offset)[0]
+        offset += 4
+        return bytes(data[offset:offset + length]).decode("utf-8"), offset + length
+    elif tag == TAG_LIST:
+        count = struct.unpack_from("<I", data, offset)[0]
+        offset += 4
+        value = []
+        for i in range(count):
+            item, offset = DecodeValue(data, offset)
+            value.append(item)
+        return value, offset
+    elif tag == TAG_DICT:
+        count = struct.unpack_from("<I", data, offset)[0]
+        offset += 4
+        value = {}
+        for i in range(count):
+            length = struct.unpack_from("<H", data, offset)[0]
+            offset += 2
+            key = bytes(data[offset:offset + length]).decode("utf-8")
+            value[key], offset = DecodeValue(data, offset + length)
+        return value, offset
+    elif tag == TAG_LIST_STREAM:
+        value = []
+        while struct.unpack_from("<B", data, offset)[0] != TAG_END:
+            item, offset = DecodeValue(data, offset)
+            value.append(item)
+        return value, offset + 1
+    elif tag == TAG_DICT_STREAM:
+        value = {}
+        while True:
+            length = struct.unpack_from("<H", data, offset)[0]
+            offset += 2
+            if length == 0xFFFF:
+                return value, offset
+            key = bytes(data[offset:offset + length]).decode("utf-8")
+            value[key], offset = DecodeValue(data, offset + length)
+    elif tag == TAG_ARRAY:
+        kind, count = struct.unpack_from("<BI", data, offset)
+        offset += 5
+        kind, typecode, stride = packed_kinds[kind]
+        length = count * stride * array.array(typecode).itemsize
+        values = UnpackArray(typecode, bytes(data[offset:offset + length]))
+        return PackedArray(kind, stride, values), offset + length
+    elif tag in binary_types:
+        kind, packer, fields = binary_types[tag]
+        values = packer.unpack_from(data, offset)
+        return TypedValue(kind, zip(fields, values)), offset + packer.size
+    raise ValueError("Unknown tag " + str(tag) + " at offset " + str(offset - 1) + ".")
+
+# Check a binary frame (or compressed packet) header, returns its flags and payload length.
+def DecodeHeader(data, expected=BINARY_MAGIC):
+    magic, version, flags, length = BINARY_HEADER.unpack_from(data, 0)
+    if magic != expected:
+        raise ValueError("Not an SFM Bridge binary frame.")
+    if version != BINARY_VERSION:
+        raise ValueError("Unsupported binary frame version " + str(version) + ".")
+    return flags, length
+
+# Decode the payload of a binary frame, joined together if it was streamed in chunks.
+def DecodePayload(payload):
+    value, offset = DecodeValue(payload, 0)
+    if offset != len(payload):
+        raise ValueError("Binary frame length does not match its contents.")
+    return value
+
+# Decode a complete binary frame that was sent in one chunk, header included.
+def DecodeFrame(data):
+    flags, length = DecodeHeader(data)
+    if flags & FLAG_MORE:
+        raise ValueError("Binary frame is the first chunk of a streamed frame.")
+    return DecodePayload(data[BINARY_HEADER.size:BINARY_HEADER.size + length])
+
+# Splits a byte stream into frames, the stream may mix JSON and binary frames
+# since the encoding can be switched while connected, and compressed packets.
+class FrameReader:
+    def __init__(self):
+        self.buffer = b""
+        # Payloads of a streamed binary frame received so far.
+        self.chunks = []
+        # Bytes of the binary frame being received and of the last complete message
+        # received uncompressed, which compressed streams can use as their dictionary.
+        self.raw = []
+        self.last = b""
+        # Compressed packets are decompressed and read by another reader.
+        self.decompressor = None
+        self.inflated = None
+    # Add received bytes, returns every frame that is now complete.
+    def feed(self, data):
+        self.buffer += data
+        frames = []
+        while True:
+            if self.buffer.startswith(b"!START!"):
+                end = self.buffer.find(b"!END!")
+                if end == -1:
+                    break
+                frames.append(json.loads(self.buffer[len(b"!START!"):end].decode("utf-8"), object_hook=DecodeJSONObject))
+                self.last = self.buffer[:end + len(b"!END!")]
+                self.buffer = self.buffer[end + len(b"!END!"):]
+            elif self.buffer.startswith(BINARY_MAGIC):
+                if len(self.buffer) < BINARY_HEADER.size:
+                    break
+                flags, length = DecodeHeader(self.buffer)
+                size = BINARY_HEADER.size + length
+                if len(self.buffer) < size:
+                    break
+                self.chunks.append(self.buffer[BINARY_HEADER.size:size])
+                self.raw.append(self.buffer[:size])
+                self.buffer = self.buffer[size:]
+                if not flags & FLAG_MORE:
+                    frames.append(DecodePayload(b"".join(self.chunks)))
+                    self.last = b"".join(self.raw)
+                    self.chunks = []
+                    self.raw = []
+            elif self.buffer.startswith(COMPRESSED_MAGIC):
+                if len(self.buffer) < BINARY_HEADER.size:
+                    break
+                flags, length = DecodeHeader(self.buffer, COMPRESSED_MAGIC)
+                size = BINARY_HEADER.size + length
+                if len(self.buffer) < size:
+                    break
+                if flags & FLAG_RESET:
+                    if flags & FLAG_DICTIONARY:
+                        if sys.version_info < (3, 3):
+                            raise ValueError("Compression dictionaries need Python 3.3 or newer.")
+                        self.decompressor = zlib.decompressobj(zdict=self.last[-COMPRESSION_DICTIONARY_SIZE:])
+                    else:
+                        self.decompressor = zlib.decompressobj()
+                    self.inflated = FrameReader()
+                elif self.decompressor is None:
+                    raise ValueError("Compressed packet received before the start of its stream.")
+                payload = self.buffer[BINARY_HEADER.size:size]
+                self.buffer = self.buffer[size:]
+                frames.extend(self.inflated.feed(self.decompressor.decompress(payload)))
+            elif len(self.buffer) >= len(b"!START!") or not (b"!START!".startswith(self.buffer) or BINARY_MAGIC.startswith(self.buffer) or COMPRESSED_MAGIC.startswith(self.buffer)):
+                raise ValueError("Stream is out of sync, expected the start of a frame.")
+            else:
+                break
+        return frames
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.stderr.write("Usage: python sfm_bridge_binary.py capture.bin\n")
+        sys.exit(1)
+    reader = FrameReader()
+    with open(sys.argv[1], "rb") as capture:
+        for frame in reader.feed(capture.read()):
+            print(json.dumps(frame, default=lambda value: value.items()))
+    if reader.buffer or reader.chunks or (reader.inflated is not None and (reader.inflated.buffer or reader.inflated.chunks)):
+        sys.stderr.write("Capture ends with an incomplete frame.\n")
+        sys.exit(1)
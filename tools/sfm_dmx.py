@@ -0,0 +1,456 @@
+# SFM Bridge: sfm_dmx.py
+# This software is licensed under the MIT License.
+# Copyright (c) 2021 KiwifruitDev
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Reads DMX files (keyvalues2 text and binary, versions 1 to 5) into the elements of
+# sfm_fake.py, so Open_Menu.py reads a session saved by SFM the same way it reads
+# SFM's own elements.
+# Session plays a session back without SFM: it finds the shot at a time and moves the
+# playhead by evaluating the animation channels of that shot onto the elements they drive.
+# Operators (rigs, constraints, flex controller mappings) aren't evaluated.
+#
+# Usage:
+#   import sfm_fake, sfm_dmx
+#   bridge = sfm_fake.LoadBridge()
+#   session = sfm_dmx.Session(sfm_dmx.ReadDMX("session.dmx"))
+#   session.Install()
+#   session.SetHeadTimeInFrames(10)
+
+import bisect
+import math
+import os
+import re
+import struct
+import sys
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from sfm_fake import Color, Element, Time, Vector
+
+DMX_HEADER = re.compile(br"\s*<!--\s*dmx\s+encoding\s+(\S+)\s+(\d+)\s+format\s+(\S+)\s+(\d+)\s*-->")
+
+# Attribute types by their id in binary DMX, array types follow with the same order.
+binary_attribute_types = [None, "element", "int", "float", "bool", "string", "binary", "time", "color", "vector2", "vector3", "vector4", "qangle", "quaternion", "matrix"]
+BINARY_ARRAY_OFFSET = 14
+# Element references in binary DMX: no element, or an element in another file (by id).
+BINARY_ELEMENT_NONE = -1
+BINARY_ELEMENT_EXTERNAL = -2
+# Time is stored in ticks of 1/10000 seconds.
+DMX_TIME_RESOLUTION = 10000.0
+
+# Element attributes Session evaluates channels from, like channel_attributes in Open_Menu.py.
+channel_attributes = ["channel", "rightvaluechannel", "leftvaluechannel", "positionChannel", "orientationChannel"]
+
+# Read a DMX file, returns its root element.
+def ReadDMX(path):
+    with open(path, "rb") as file:
+        return ParseDMX(file.read())
+
+def ParseDMX(data):
+    header = DMX_HEADER.match(data)
+    if header is None:
+        raise ValueError("Not a DMX file.")
+    encoding = header.group(1).decode("ascii")
+    version = int(header.group(2))
+    if encoding == "binary":
+        # The header line ends with a null byte.
+        return BinaryReader(data, data.index(b"\0", header.end()) + 1, version).read()
+    if encoding in ("keyvalues2", "keyvalues2_flat"):
+        return KeyValues2Reader(data[header.end():].decode("utf-8", "replace")).read()
+    raise ValueError("Unsupported DMX encoding " + encoding + ".")
+
+# Set an attribute read from a file, name is already an attribute of every element.
+def AddAttribute(element, name, typestring, value):
+    if name in element.names:
+        element.SetValue(name, value)
+        return value
+    return element.AddAttribute(name, typestring, value)
+
+class BinaryReader(object):
+    def __init__(self, data, position, version):
+        if version < 1 or version > 5:
+            raise ValueError("Unsupported binary DMX version " + str(version) + ".")
+        self.data = data
+        self.position = position
+        self.version = version
+        self.strings = []
+        self.elements = []
+    def unpack(self, format):
+        values = struct.unpack_from(format, self.data, self.position)
+        self.position += struct.calcsize(format)
+        return values
+    def int(self):
+        return self.unpack("<i")[0]
+    def text(self):
+        end = self.data.index(b"\0", self.position)
+        text = self.data[self.position:end].decode("utf-8", "replace")
+        self.position = end + 1
+        return text
+    # A string from the string table (version 2 and later), or inline.
+    def string(self, table):
+        if not table:
+            return self.text()
+        return self.strings[self.unpack("<i" if self.version >= 5 else "<h")[0]]
+    def read(self):
+        if self.version >= 2:
+            self.strings = [self.text() for i in range(self.int())]
+        for i in range(self.int()):
+            typestring = self.string(self.version >= 2)
+            name = self.string(self.version >= 4)
+            element = Element(typestring, name)
+            element.id = str(uuid.UUID(bytes_le=self.data[self.position:self.position + 16]))
+            self.position += 16
+            self.elements.append(element)
+        for element in self.elements:
+            for i in range(self.int()):
+                name = self.string(self.version >= 2)
+                typeid = self.unpack("<B")[0]
+                if typeid > BINARY_ARRAY_OFFSET:
+                    typestring = binary_attribute_types[typeid - BINARY_ARRAY_OFFSET] + "_array"
+                    value = [self.value(typestring[:-6], True) for item in range(self.int())]
+                else:
+                    typestring = binary_attribute_types[typeid]
+                    value = self.value(typestring, False)
+                AddAttribute(element, name, typestring, value)
+        return self.elements[0] if self.elements else None
+    def value(self, typestring, item):
+        if typestring == "element":
+            index = self.int()
+            if index == BINARY_ELEMENT_EXTERNAL:
+                self.text()
+                return None
+            return self.elements[index] if index >= 0 else None
+        if typestring == "int":
+            return self.int()
+        if typestring == "float":
+            return self.unpack("<f")[0]
+        if typestring == "bool":
+            return self.unpack("<B")[0] != 0
+        if typestring == "string":
+            # Array items are always inline.
+            return self.string(self.version >= 4 and not item)
+        if typestring == "binary":
+            size = self.int()
+            self.position += size
+            return self.data[self.position - size:self.position]
+        if typestring == "time":
+            return Time(self.int() / DMX_TIME_RESOLUTION)
+        if typestring == "color":
+            return Color(*self.unpack("<4B"))
+        if typestring == "vector2":
+            return Vector(*(self.unpack("<2f") + (0.0,)))
+        if typestring in ("vector3", "qangle"):
+            return Vector(*self.unpack("<3f"))
+        if typestring in ("vector4", "quaternion"):
+            return Vector(*self.unpack("<4f"))
+        if typestring == "matrix":
+            return list(self.unpack("<16f"))
+        raise ValueError("Unknown binary DMX attribute type " + str(typestring) + ".")
+
+# Values in keyvalues2 files are strings, converted by their type.
+def Floats(text):
+    return [float(number) for number in text.split()]
+
+keyvalues2_values = {
+    "int": int,
+    "float": float,
+    "bool": lambda text: int(text) != 0,
+    "string": lambda text: text,
+    "binary": lambda text: bytearray.fromhex(text),
+    "time": lambda text: Time(float(text)),
+    "color": lambda text: Color(*[int(number) for number in text.split()]),
+    "vector2": lambda text: Vector(*(Floats(text) + [0.0])),
+    "vector3": lambda text: Vector(*Floats(text)),
+    "vector4": lambda text: Vector(*Floats(text)),
+    "qangle": lambda text: Vector(*Floats(text)),
+    "quaternion": lambda text: Vector(*Floats(text)),
+    "matrix": Floats,
+}
+
+KEYVALUES2_TOKEN = re.compile(r'"((?:[^"\\]|\\.)*)"|([{}\[\],])|(//[^\n]*|\s+)')
+KEYVALUES2_ESCAPE = re.compile(r"\\(.)")
+keyvalues2_escapes = {"n": "\n", "t": "\t"}
+
+# Elements are nested in their parents or listed after the root and referenced by id.
+# Nesting can be as deep as the bone hierarchy, so it is read with a stack instead of recursion.
+class KeyValues2Reader(object):
+    def __init__(self, text):
+        self.tokens = []
+        position = 0
+        while position < len(text):
+            match = KEYVALUES2_TOKEN.match(text, position)
+            if match is None:
+                raise ValueError("Unexpected character in keyvalues2 at offset " + str(position) + ".")
+            position = match.end()
+            if match.group(1) is not None:
+                self.tokens.append((True, KEYVALUES2_ESCAPE.sub(lambda escape: keyvalues2_escapes.get(escape.group(1), escape.group(1)), match.group(1))))
+            elif match.group(2) is not None:
+                self.tokens.append((False, match.group(2)))
+        self.position = 0
+    def next(self):
+        if self.position >= len(self.tokens):
+            raise ValueError("Unexpected end of keyvalues2.")
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+    def string(self):
+        quoted, text = self.next()
+        if not quoted:
+            raise ValueError("Expected a string in keyvalues2, got " + text + ".")
+        return text
+    def expect(self, symbol):
+        quoted, text = self.next()
+        if quoted or text != symbol:
+            raise ValueError("Expected " + symbol + " in keyvalues2, got " + text + ".")
+    # Only valid when the next token is a symbol.
+    def peek(self):
+        quoted, text = self.tokens[self.position] if self.position < len(self.tokens) else (False, None)
+        return None if quoted else text
+    def read(self):
+        roots = []
+        ids = {}
+        # References to resolve once every element is known: (container, key, id), where
+        # the container is an element (key is the attribute name) or an element array (key is the index).
+        references = []
+        # Open elements and element arrays: (element, None) or (element, array)
+        stack = []
+        while self.position < len(self.tokens):
+            if not stack:
+                element = Element(self.string(), "")
+                self.expect("{")
+                roots.append(element)
+                stack.append((element, None))
+                continue
+            element, items = stack[-1]
+            if items is not None:
+                symbol = self.peek()
+                if symbol == "]":
+                    self.next()
+                    stack.pop()
+                elif symbol == ",":
+                    self.next()
+                else:
+                    typestring = self.string()
+                    if typestring == "element":
+                        references.append((items, len(items), self.string()))
+                        items.append(None)
+                    else:
+                        child = Element(typestring, "")
+                        self.expect("{")
+                        items.append(child)
+                        stack.append((child, None))
+                continue
+            if self.peek() == "}":
+                self.next()
+                stack.pop()
+                continue
+            name = self.string()
+            typestring = self.string()
+            if typestring == "elementid":
+                element.id = self.string()
+                ids[element.id] = element
+            elif typestring == "element":
+                references.append((element, name, self.string()))
+                AddAttribute(element, name, typestring, None)
+            elif typestring == "element_array":
+                self.expect("[")
+                stack.append((element, AddAttribute(element, name, typestring, [])))
+            elif typestring.endswith("_array"):
+                convert = keyvalues2_values[typestring[:-6]]
+                self.expect("[")
+                values = []
+                while self.peek() != "]":
+                    if self.peek() == ",":
+                        self.next()
+                    else:
+                        values.append(convert(self.string()))
+                self.next()
+                AddAttribute(element, name, typestring, values)
+            elif typestring in keyvalues2_values:
+                AddAttribute(element, name, typestring, keyvalues2_values[typestring](self.string()))
+            else:
+                # Anything else is the type of an element written in place.
+                child = Element(typestring, "")
+                self.expect("{")
+                AddAttribute(element, name, "element", child)
+                stack.append((child, None))
+        if stack:
+            raise ValueError("Unexpected end of keyvalues2.")
+        for container, key, id in references:
+            if isinstance(container, Element):
+                container.SetValue(key, ids.get(id))
+            else:
+                container[key] = ids.get(id)
+        return roots[0] if roots else None
+
+# The value of an element's attribute, or None if it doesn't have it.
+def Value(element, name):
+    if element is None or name not in element.names:
+        return None
+    return element.GetValue(name)
+
+def Items(element, name):
+    return [item for item in Value(element, name) or [] if item is not None]
+
+def Seconds(time):
+    return time.GetSeconds() if time is not None else 0.0
+
+# A clip's start, duration, offset and scale in seconds.
+def TimeFrame(clip):
+    timeFrame = Value(clip, "timeFrame")
+    if timeFrame is None:
+        return 0.0, 0.0, 0.0, 1.0
+    return Seconds(Value(timeFrame, "start")), Seconds(Value(timeFrame, "duration")), Seconds(Value(timeFrame, "offset")), Value(timeFrame, "scale") or 1.0
+
+# Interpolate between two log values, types that can't be interpolated hold the first.
+def Interpolate(typestring, first, second, fraction):
+    if typestring == "float":
+        return first + (second - first) * fraction
+    if typestring in ("vector2", "vector3", "qangle"):
+        return Vector(first.x + (second.x - first.x) * fraction, first.y + (second.y - first.y) * fraction, first.z + (second.z - first.z) * fraction)
+    if typestring in ("vector4", "quaternion"):
+        sign = 1.0
+        # Quaternions take the shorter way around and are normalized again.
+        if typestring == "quaternion" and first.x * second.x + first.y * second.y + first.z * second.z + first.w * second.w < 0:
+            sign = -1.0
+        components = [a + (b * sign - a) * fraction for a, b in zip((first.x, first.y, first.z, first.w), (second.x, second.y, second.z, second.w))]
+        if typestring == "quaternion":
+            length = math.sqrt(sum([component * component for component in components])) or 1.0
+            components = [component / length for component in components]
+        return Vector(*components)
+    return first
+
+# A session's movie, played back without SFM. It stands in for sfmApp (see Install): the
+# movie, its film track and the playhead.
+class Session(object):
+    def __init__(self, root, frameRate=None):
+        self.root = root
+        # The movie is the session's active clip, a file can also hold a single film clip.
+        self.movie = Value(root, "activeClip") or root
+        settings = Value(Value(root, "settings"), "movieSettings")
+        self.frameRate = float(frameRate or Value(settings, "frameRate") or 24)
+        # Shots are the clips of the movie's film track: (start, end, clip)
+        self.shots = []
+        for track in Items(Value(self.movie, "subClipTrackGroup"), "tracks"):
+            if track.GetName().lower() == "film":
+                for clip in Items(track, "children"):
+                    start, duration, offset, scale = TimeFrame(clip)
+                    self.shots.append((start, start + duration, clip))
+        if not self.shots and self.movie is not None and self.movie.GetTypeString() == "DmeFilmClip":
+            start, duration, offset, scale = TimeFrame(self.movie)
+            self.shots.append((start, start + duration, self.movie))
+        self.shots.sort(key=lambda shot: shot[0])
+        self.frame = 0
+        # Channels of each shot (by element id): (channel, clip time frame or None)
+        self.channels = {}
+        # Log layer element id to its key times in seconds.
+        self.times = {}
+    # First and last frame of a shot.
+    def Frames(self, shot):
+        start, end, clip = shot
+        return int(round(start * self.frameRate)), int(round(end * self.frameRate)) - 1
+    # The stand-ins for the movie and its film track.
+    def GetValue(self, name):
+        value = Value(self.movie, name)
+        if value is None and name == "mapname" and self.shots:
+            return Value(self.shots[0][2], name)
+        return value
+    def FindOrCreateFilmTrack(self):
+        return self
+    def FindShotAtTime(self, seconds):
+        # Frame times are rounded, so shots match from a little before they start.
+        for shot in self.shots:
+            if shot[0] - 1e-6 <= seconds < shot[1] - 1e-6:
+                return shot
+        return None
+    def FindFilmClipAtTime(self, time):
+        shot = self.FindShotAtTime(time.GetSeconds())
+        return shot[2] if shot is not None else None
+    def GetFramesPerSecond(self):
+        return self.frameRate
+    def GetHeadTimeInFrames(self):
+        return self.frame
+    # Move the playhead: every channel of the shot at the frame sets the attribute it drives.
+    def SetHeadTimeInFrames(self, frame):
+        self.frame = frame
+        seconds = frame / self.frameRate
+        shot = self.FindShotAtTime(seconds)
+        if shot is None:
+            return
+        start, duration, offset, scale = TimeFrame(shot[2])
+        local = (seconds - start) * scale + offset
+        for channel, timeFrame in self.ShotChannels(shot[2]):
+            if timeFrame is None:
+                self.Evaluate(channel, local)
+            else:
+                self.Evaluate(channel, (local - timeFrame[0]) * timeFrame[3] + timeFrame[2])
+    # The channels clips on the shot's tracks, then the channels of its animation set controls
+    # that aren't on a track.
+    def ShotChannels(self, clip):
+        channels = self.channels.get(clip.GetId())
+        if channels is not None:
+            return channels
+        channels = []
+        seen = set()
+        for group in Items(clip, "trackGroups"):
+            for track in Items(group, "tracks"):
+                for child in Items(track, "children"):
+                    if child.GetTypeString() == "DmeChannelsClip":
+                        for channel in Items(child, "channels"):
+                            if channel.GetId() not in seen:
+                                seen.add(channel.GetId())
+                                channels.append((channel, TimeFrame(child)))
+        for animationSet in Items(clip, "animationSets"):
+            for control in Items(animationSet, "controls"):
+                for name in channel_attributes:
+                    channel = Value(control, name)
+                    if channel is not None and channel.GetId() not in seen:
+                        seen.add(channel.GetId())
+                        channels.append((channel, None))
+        self.channels[clip.GetId()] = channels
+        return channels
+    def Evaluate(self, channel, seconds):
+        target = Value(channel, "toElement")
+        name = Value(channel, "toAttribute")
+        log = Value(channel, "log")
+        if target is None or not name or log is None:
+            return
+        layers = Items(log, "layers")
+        layer = layers[0] if layers else None
+        values = layer.GetAttribute("values") if layer is not None else None
+        times = self.times.get(layer.GetId()) if layer is not None else None
+        if times is None and layer is not None:
+            times = self.times[layer.GetId()] = [Seconds(time) for time in Value(layer, "times") or []]
+        if values is not None and times and values.count() > 0:
+            typestring = values.GetTypeString()[:-len("_array")]
+            items = values.GetValue()
+            count = min(len(times), values.count())
+            index = bisect.bisect_right(times, seconds, 0, count)
+            if index == 0:
+                value = items[0]
+            elif index >= count:
+                value = items[count - 1]
+            else:
+                span = times[index] - times[index - 1]
+                value = Interpolate(typestring, items[index - 1], items[index], (seconds - times[index - 1]) / span if span > 0 else 0.0)
+        elif Value(log, "usedefaultvalue"):
+            typestring = log.GetAttribute("defaultvalue").GetTypeString()
+            value = Value(log, "defaultvalue")
+        else:
+            return
+        AddAttribute(target, name, typestring, value)
+    # Make sfmApp (installed by sfm_fake.LoadBridge) play this session.
+    def Install(self):
+        app = sys.modules["sfmApp"]
+        app.GetMovie = lambda: self
+        app.GetFramesPerSecond = self.GetFramesPerSecond
+        app.GetHeadTimeInFrames = self.GetHeadTimeInFrames
+        app.SetHeadTimeInFrames = self.SetHeadTimeInFrames
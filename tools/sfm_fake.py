@@ -0,0 +1,271 @@
+# SFM Bridge: sfm_fake.py
+# This software is licensed under the MIT License.
+# Copyright (c) 2021 KiwifruitDev
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Stand-ins for the modules SFM gives its scripts (sfm, vs, sfmApp and PySide),
+# so Open_Menu.py can run outside of SFM, on Python 2.7 or 3.
+#
+# Usage:
+#   import sfm_fake
+#   bridge = sfm_fake.LoadBridge()
+#   sfm_fake.SetScene(sfm_fake.BuildScene(animationsets=4, bones=60))
+#   bridge.ParseElement(sfm_fake.GetClip(), None)
+
+import math
+import os
+import sys
+import types
+
+# Element ids are unique for the whole process, like in SFM.
+next_id = [0]
+
+class Vector(object):
+    def __init__(self, x, y, z, w=0.0):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.w = w
+
+class Color(object):
+    def __init__(self, r, g, b, a):
+        self.values = (r, g, b, a)
+    def r(self):
+        return self.values[0]
+    def g(self):
+        return self.values[1]
+    def b(self):
+        return self.values[2]
+    def a(self):
+        return self.values[3]
+
+class Time(object):
+    def __init__(self, seconds):
+        self.seconds = seconds
+    def GetSeconds(self):
+        return self.seconds
+
+# Array attribute values, count() is the item count like SFM's arrays.
+class Array(list):
+    def count(self):
+        return len(self)
+
+class Attribute(object):
+    def __init__(self, element, index):
+        self.element = element
+        self.index = index
+    def GetName(self):
+        return self.element.attributes[self.index][0]
+    def GetTypeString(self):
+        return self.element.attributes[self.index][1]
+    def GetValue(self):
+        return self.element.attributes[self.index][2]
+    def count(self):
+        return len(self.element.attributes[self.index][2])
+    def NextAttribute(self):
+        if self.index + 1 < len(self.element.attributes):
+            return Attribute(self.element, self.index + 1)
+        return None
+
+# A DmElement: a type and an ordered list of (name, type string, value) attributes.
+class Element(object):
+    def __init__(self, typestring, name):
+        next_id[0] += 1
+        self.id = next_id[0]
+        self.typestring = typestring
+        self.attributes = []
+        self.names = {}
+        self.AddAttribute("name", "string", name)
+    def AddAttribute(self, name, typestring, value):
+        if typestring.endswith("_array"):
+            value = Array(value)
+        self.names[name] = len(self.attributes)
+        self.attributes.append((name, typestring, value))
+        return value
+    def SetValue(self, name, value):
+        index = self.names[name]
+        self.attributes[index] = (name, self.attributes[index][1], value)
+    def GetId(self):
+        return self.id
+    def GetTypeString(self):
+        return self.typestring
+    def GetName(self):
+        return self.GetValue("name")
+    def FirstAttribute(self):
+        if self.attributes:
+            return Attribute(self, 0)
+        return None
+    def GetAttribute(self, name):
+        if name in self.names:
+            return Attribute(self, self.names[name])
+        return None
+    def GetValue(self, name):
+        return self.attributes[self.names[name]][2]
+    # Attributes can be read as properties, e.g. clip.animationSets.count().
+    def __getattr__(self, name):
+        names = self.__dict__.get("names")
+        if names is None or name not in names:
+            raise AttributeError(name)
+        return self.attributes[names[name]][2]
+
+def Transform(name, position):
+    transform = Element("DmeTransform", name)
+    transform.AddAttribute("position", "vector3", Vector(*position))
+    transform.AddAttribute("orientation", "quaternion", Vector(0.0, 0.0, 0.0, 1.0))
+    return transform
+
+# A channel driving an attribute, with a log of keys keyframes.
+def Channel(name, target, attribute, keys):
+    layer = Element("DmeFloatLogLayer", name)
+    layer.AddAttribute("times", "time_array", [Time(i / 24.0) for i in range(keys)])
+    layer.AddAttribute("values", "float_array", [math.sin(i * 0.1) for i in range(keys)])
+    log = Element("DmeFloatLog", name)
+    log.AddAttribute("layers", "element_array", [layer])
+    channel = Element("DmeChannel", name)
+    channel.AddAttribute("log", "element", log)
+    channel.AddAttribute("toElement", "element", target)
+    channel.AddAttribute("toAttribute", "string", attribute)
+    return channel
+
+# A film clip shaped like an SFM shot: a camera and animation sets, each with a game model
+# (a tree of bones, flex weights and their global flex controllers) and controls whose
+# channels drive the flex weights. arraysize is the number of keyframes in every channel log
+# and of items in each model's packed vector array.
+# Returns the clip and the elements animate() moves: (bone transforms, game models).
+def BuildScene(animationsets=4, bones=60, flexcontrollers=40, arraysize=64):
+    clip = Element("DmeFilmClip", "shot1")
+    timeFrame = clip.AddAttribute("timeFrame", "element", Element("DmeTimeFrame", "timeFrame"))
+    timeFrame.AddAttribute("start", "time", Time(0.0))
+    timeFrame.AddAttribute("duration", "time", Time(10.0))
+    timeFrame.AddAttribute("offset", "time", Time(0.0))
+    timeFrame.AddAttribute("scale", "float", 1.0)
+    camera = clip.AddAttribute("camera", "element", Element("DmeCamera", "camera1"))
+    camera.AddAttribute("transform", "element", Transform("camera1", (0.0, -100.0, 64.0)))
+    camera.AddAttribute("fieldOfView", "float", 50.0)
+    camera.AddAttribute("color", "color", Color(255, 255, 255, 255))
+    sets = []
+    transforms = []
+    models = []
+    for i in range(animationsets):
+        name = "model" + str(i)
+        model = Element("DmeGameModel", name)
+        model.AddAttribute("modelName", "string", "models/" + name + ".mdl")
+        model.AddAttribute("skin", "int", 0)
+        model.AddAttribute("visible", "bool", True)
+        model.AddAttribute("transform", "element", Transform(name, (i * 64.0, 0.0, 0.0)))
+        # Bones form a binary tree under the model.
+        dags = []
+        for b in range(bones):
+            dag = Element("DmeDag", "bone" + str(b))
+            transform = dag.AddAttribute("transform", "element", Transform("bone" + str(b), (0.0, 0.0, b * 2.0)))
+            dag.AddAttribute("children", "element_array", [])
+            if b > 0:
+                dags[(b - 1) // 2].GetValue("children").append(dag)
+            dags.append(dag)
+            transforms.append(transform)
+        model.AddAttribute("children", "element_array", dags[:1])
+        model.AddAttribute("bones", "element_array", [dag.GetValue("transform") for dag in dags])
+        model.AddAttribute("flexWeights", "float_array", [0.0] * flexcontrollers)
+        model.AddAttribute("points", "vector3_array", [Vector(p, p * 0.5, p * 0.25) for p in range(arraysize)])
+        # Flex controllers point back at their model, as they do in SFM.
+        controllers = []
+        for f in range(flexcontrollers):
+            controller = Element("DmeGlobalFlexControllerOperator", "flex" + str(f))
+            controller.AddAttribute("flexWeight", "float", 0.0)
+            controller.AddAttribute("gameModel", "element", model)
+            controllers.append(controller)
+        model.AddAttribute("globalFlexControllers", "element_array", controllers)
+        controls = []
+        for f in range(flexcontrollers):
+            control = Element("DmeAnimationSetControl", "flex" + str(f))
+            control.AddAttribute("value", "float", 0.0)
+            control.AddAttribute("channel", "element", Channel("flex" + str(f), model, "flexWeights", arraysize))
+            controls.append(control)
+        animationSet = Element("DmeAnimationSet", name)
+        animationSet.AddAttribute("gameModel", "element", model)
+        animationSet.AddAttribute("controls", "element_array", controls)
+        sets.append(animationSet)
+        models.append(model)
+    clip.AddAttribute("animationSets", "element_array", sets)
+    return clip, (transforms, models)
+
+# Move the scene to a frame: every moving-th bone and each model's flex weights change.
+def Animate(animated, frame, moving=4):
+    transforms, models = animated
+    for i in range(0, len(transforms), moving):
+        position = transforms[i].GetValue("position")
+        transforms[i].SetValue("position", Vector(position.x, math.sin(frame * 0.1 + i), position.z))
+    for model in models:
+        count = len(model.GetValue("flexWeights"))
+        model.SetValue("flexWeights", Array([abs(math.sin(frame * 0.05 + f)) for f in range(count)]))
+
+class FilmTrack(object):
+    def FindFilmClipAtTime(self, time):
+        return scene["clip"]
+
+class Movie(object):
+    def GetValue(self, name):
+        return {"name": "benchmark", "mapname": "maps/stage.bsp"}[name]
+    def FindOrCreateFilmTrack(self):
+        return FilmTrack()
+
+# The shot every frame is read from, set with SetScene.
+scene = {"clip": None, "animated": None, "frame": 0, "moving": 4}
+
+def SetScene(built, moving=4):
+    scene["clip"], scene["animated"] = built
+    scene["moving"] = moving
+    scene["frame"] = 0
+
+def GetClip():
+    return scene["clip"]
+
+def SetHeadTimeInFrames(frame):
+    if frame != scene["frame"] and scene["animated"] is not None:
+        Animate(scene["animated"], frame, scene["moving"])
+    scene["frame"] = frame
+
+# Install the fake modules into sys.modules, messages are written to stderr when verbose.
+def InstallModules(verbose=False):
+    modules = {}
+    for name in ["sfm", "vs", "vs.movieobjects", "sfmApp", "PySide", "PySide.QtGui", "PySide.QtCore", "PySide.shiboken"]:
+        modules[name] = sys.modules[name] = types.ModuleType(name)
+    modules["sfm"].Msg = (lambda text: sys.stderr.write(text)) if verbose else (lambda text: None)
+    modules["vs"].movieobjects = modules["vs.movieobjects"]
+    modules["vs"].DmeTime_t = Time
+    app = modules["sfmApp"]
+    app.GetMovie = lambda: Movie() if scene["clip"] is not None else None
+    app.GetHeadTimeInFrames = lambda: scene["frame"]
+    app.SetHeadTimeInFrames = SetHeadTimeInFrames
+    app.GetFramesPerSecond = lambda: 24.0
+    app.ProcessEvents = lambda: None
+    app.RegisterTabWindow = lambda *args: None
+    app.ShowTabWindow = lambda *args: None
+    modules["PySide.QtGui"].QWidget = object
+    modules["PySide"].QtGui = modules["PySide.QtGui"]
+    modules["PySide"].QtCore = modules["PySide.QtCore"]
+    modules["PySide"].shiboken = modules["PySide.shiboken"]
+    return modules
+
+# Load Open_Menu.py as a module with the fake modules installed. The tab window at the
+# bottom of the script isn't created, so settings come from the environment the same way
+# they do when other scripts use SFM Bridge, and closing is left to the caller.
+def LoadBridge(path=None, verbose=False):
+    InstallModules(verbose)
+    if path is None:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "mainmenu", "SFM Bridge", "Open_Menu.py")
+    with open(path) as script:
+        source = script.read()
+    source = source[:source.index("global SFM_BRIDGE_TAB_WINDOW\nSFM_BRIDGE_TAB_WINDOW")]
+    module = types.ModuleType("Open_Menu")
+    module.__file__ = path
+    exec(compile(source, path, "exec"), module.__dict__)
+    module.register = lambda function: None
+    return module